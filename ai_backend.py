@@ -1,191 +1,409 @@
-import json
+import logging
 import os
-import datetime
+import random
+import sys
+import threading
 import time
-import uuid
-from openai import OpenAI
-from openai import APIError, APIConnectionError, RateLimitError  # 导入openai常见异常
+from types import SimpleNamespace
+
+from answer_cache import AnswerCache, make_key
+from metrics import metrics
+from prompts import DETAILED, AnswerTruncated, build_messages, cache_prompt, prompt_stats
+from prompts import AI_PRODUCT_MANAGER_PROMPT  # noqa: F401  指南已移到prompts.py，这里保留导出兼容旧代码
+from storage import CardStore, open_store
 
 # 注意：在Streamlit Cloud环境中，API密钥通过secrets提供
+# openai 在首次创建真实客户端时才导入，导入本模块本身不做任何网络或文件I/O
+
+logger = logging.getLogger(__name__)
+
+MOCK_ANSWER = "当前环境无法连接到AI服务。这是一个示例回答，展示了AI产品经理学习助手的基本功能。\n\n请配置环境变量ARK_API_KEY以获取完整的AI回答能力。"
+
+def openai_errors():
+    """openai库的常见异常类型。openai尚未被导入时不可能抛出这些异常，返回空元组即可，避免为此导入openai"""
+    openai = sys.modules.get("openai")
+    if openai is None:
+        return ()
+    return (openai.APIError, openai.APIConnectionError, openai.RateLimitError)
+
+
+class MockRateLimitError(Exception):
+    """MockArk 模拟的限流错误"""
+
 
-# 定义AI产品经理面试回答指南作为基础prompt（保持不变）
-AI_PRODUCT_MANAGER_PROMPT = """你是一名非常资深的AI产品经理。我是一个正在进行AI产品求职的人。我会向你请教一系列AI产品经理面试问题，希望你能结合 AI 产品的特性、行业实践和自身对岗位的理解，给出逻辑清晰、内容详实且有深度的回答。
-回答时请遵循以下原则：
-只需要进行问题的回答，无需寒暄客套。
-字数限制在2000字以内;
-针对性：紧密围绕问题核心，不偏离主题；
-专业性：体现对 AI 技术（如大模型能力边界、数据安全、算法逻辑等）的扎实认知，不出现技术认知错误；
-产品思维：必须有产品经理必备的思维（如用户需求分析、产品定位、迭代策略等）；
-商业思维：如果涉及实际业务应用，需要考虑落地性、商业化等问题，体现出商业思维。
-表达：语言简洁，用词专业，结构化，采用 "观点 + 分析 " 的模式，先用核心观点回应，再分点展开分析。
-案例：如果只讨论理论不足以解释问题，必要时可结合过往经验或行业案例佐证（可合理虚构符合逻辑的经历）；
-前瞻性：在回答中体现对 AI 产品发展趋势的思考，如AI产品体验与比较、技术与场景的结合、用户体验的优化方向、伦理合规等潜在问题的应对思路；
-"""
-
-# 2. 简化MockArk：仅保留模拟回答功能（删除原SDK兼容逻辑）
+def backoff_delay(retries, scale=1.0):
+    """带随机抖动的指数退避，避免大量并发请求在同一时刻重试"""
+    return scale * 2 ** retries * random.uniform(0.5, 1.5)
+
+# 2. 简化MockArk：仅保留模拟回答功能，接口与openai客户端的 chat.completions.create 一致
 class MockArk:
+    is_mock = True  # 模拟回答不写入回答缓存
+
+    def __init__(self, answer=MOCK_ANSWER, chunk_size=8, chunk_delay=0.0, latency=0.0, failure_rate=0.0,
+                 slow_rate=0.0, slow_latency=0.0):
+        self.answer = answer
+        self.chunk_size = chunk_size      # stream=True 时每个分片的字符数
+        self.chunk_delay = chunk_delay    # 每个分片之间的模拟延迟（秒）
+        self.latency = latency            # 每次请求的模拟延迟（秒），用于离线压测
+        self.failure_rate = failure_rate  # 模拟限流失败的概率（0~1）
+        self.slow_rate = slow_rate        # 以该概率改用 slow_latency 作为延迟，模拟长尾
+        self.slow_latency = slow_latency
+
+    @property
     def chat(self):
-        class ChatCompletions:
-            def create(self, model, messages, max_tokens=3000, temperature=0.8):
-                # 模拟回答（保持原提示文案）
-                class MockResponse:
-                    class Choices:
-                        def __init__(self):
-                            self.message = type('obj', (), {'content': "当前环境无法连接到AI服务。这是一个示例回答，展示了AI产品经理学习助手的基本功能。\n\n请配置环境变量ARK_API_KEY以获取完整的AI回答能力。"})
-                        @property
-                        def choices(self):
-                            return [self]
-                return MockResponse.Choices()
-        return ChatCompletions()
+        return self
+
+    @property
+    def completions(self):
+        return self
+
+    def create(self, model, messages, max_tokens=3000, temperature=0.8, stream=False, stream_options=None):
+        latency = self.slow_latency if self.slow_rate and random.random() < self.slow_rate else self.latency
+        if latency:
+            time.sleep(latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise MockRateLimitError("模拟限流：请求过于频繁")
+        # 模拟的token用量按字符数近似，回答超过 max_tokens 时与真实服务一样截断
+        answer = self.answer[:max_tokens]
+        finish_reason = "length" if len(self.answer) > max_tokens else "stop"
+        usage = SimpleNamespace(prompt_tokens=sum(len(m["content"]) for m in messages),
+                                completion_tokens=len(answer))
+        if stream:
+            return self._stream(answer, finish_reason,
+                                usage if stream_options and stream_options.get("include_usage") else None)
+        message = SimpleNamespace(content=answer)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)], usage=usage)
+
+    def _stream(self, answer, finish_reason, usage=None):
+        # 模拟流式响应：与openai一样逐个产出 choices[0].delta.content，最后一个分片带 finish_reason；
+        # 要求返回用量时最后追加一个 choices 为空、携带 usage 的分片
+        for i in range(0, len(answer), self.chunk_size):
+            if self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            delta = SimpleNamespace(content=answer[i:i + self.chunk_size])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)], usage=None)
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None),
+                                                       finish_reason=finish_reason)], usage=None)
+        if usage is not None:
+            yield SimpleNamespace(choices=[], usage=usage)
+
+DEFAULT_MODEL = 'doubao-seed-1-6-250615'
 
 class AIClient:
-    def __init__(self, model_name='doubao-seed-1-6-250615'):
-        """初始化OpenAI客户端（适配ARK服务），从环境变量获取API密钥"""
+    def __init__(self, model_name=DEFAULT_MODEL, cache=None, rate_limiter=None):
+        """初始化OpenAI客户端（适配ARK服务），从环境变量获取API密钥；
+        设置 MODEL_POOL_CONFIG 时改用 routing.ModelPool（多后端路由、对冲与熔断）。
+        cache 为 AnswerCache 时，相同问题直接返回缓存的回答；
+        rate_limiter 为带 acquire() 的限流器（如 batch.TokenBucket）时，每次请求前先取令牌"""
         self.api_key = os.environ.get('ARK_API_KEY')
         self.model_name = model_name
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.backoff_scale = 1.0  # 退避时长的缩放系数，离线压测时可调小
         self.client = None
         self.initialize_client()  # 初始化客户端（真实/模拟）
     
     def initialize_client(self):
         """3. 初始化客户端：改用openai.OpenAI，失败则用模拟客户端"""
         try:
+            pool_config = os.environ.get('MODEL_POOL_CONFIG')
+            if pool_config:
+                from routing import load_pool
+                self.client = load_pool(pool_config)
+                logger.info("使用模型池: %s", ", ".join(b.name for b in self.client.backends))
             # 若有API密钥，初始化真实OpenAI客户端（指向ARK服务）
-            if self.api_key:
+            elif self.api_key:
+                from openai import OpenAI  # 延迟导入：只有真正需要调用ARK服务时才加载openai
                 self.client = OpenAI(
                     base_url="https://ark.cn-beijing.volces.com/api/v3",  # ARK的OpenAI兼容接口地址
                     api_key=self.api_key
                 )
-                print("OpenAI客户端（适配ARK）初始化成功")
+                logger.info("OpenAI客户端（适配ARK）初始化成功")
             else:
                 # 无密钥，使用模拟客户端
                 self.client = MockArk()
-                print("使用模拟AI客户端（未配置ARK_API_KEY）")
+                logger.info("使用模拟AI客户端（未配置ARK_API_KEY）")
         except Exception as e:
-            print(f"初始化客户端失败: {str(e)}")
+            logger.error("初始化客户端失败: %s", e)
             self.client = MockArk()
     
-    def generate_answer(self, question, category="AI产品经理面试", max_retries=3):
-        """4. 生成回答：适配openai库的调用格式"""
+    def _cache_key(self, question, category, mode=DETAILED):
+        """模拟客户端的回答不写入缓存"""
+        if self.cache is None or getattr(self.client, "is_mock", False):
+            return None
+        return make_key(self.model_name, cache_prompt(mode), category, question)
+
+    def _served(self):
+        """刚完成的请求实际由哪个模型回答、是否为模拟回答：模型池按胜出的后端，否则为 model_name"""
+        served_backend = getattr(self.client, "served_backend", None)
+        backend = served_backend() if served_backend else None
+        if backend is None:
+            return self.model_name, getattr(self.client, "is_mock", False)
+        return backend.model, backend.is_mock
+
+    def _cacheable(self, model, is_mock):
+        """缓存键按 model_name 计算：只缓存由该模型给出的真实回答，模型池中备用模型的回答不缓存"""
+        return model == self.model_name and not is_mock
+
+    def _observe_request(self, mode, outcome, attempt_started, model=None):
+        metrics.observe("llm_request_seconds", time.perf_counter() - attempt_started,
+                        model=model or self.model_name, mode=mode, outcome=outcome)
+
+    def _record_usage(self, usage, mode, model):
+        """记录 response.usage 中的 prompt/completion token 数，服务未返回用量时跳过"""
+        if usage is None:
+            return
+        for kind in ("prompt", "completion"):
+            tokens = getattr(usage, f"{kind}_tokens", None)
+            if tokens:
+                metrics.inc("llm_tokens_total", tokens, model=model, kind=kind)
+        completion = getattr(usage, "completion_tokens", None)
+        if completion:
+            prompt_stats.record_completion(completion, mode)
+        # 服务端前缀缓存命中的输入token（system消息固定不变时可复用）
+        cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+        if cached:
+            metrics.inc("llm_tokens_total", cached, model=model, kind="cached_prompt")
+            prompt_stats.record_cached(cached)
+
+    def generate_answer(self, question, category="AI产品经理面试", max_retries=3, mode=DETAILED):
+        """4. 生成回答：适配openai库的调用格式。mode 为 prompts.DETAILED 或 prompts.BRIEF"""
         if not self.client:
             self.initialize_client()
             if not self.client:
                 return False, "无法初始化AI客户端，请检查API密钥是否正确"
         
+        cache_key = self._cache_key(question, category, mode)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return True, cached
+        
+        # 构建提示词：指南作为system消息，输出上限按回答模式设置
+        messages, max_tokens = build_messages(question, category, mode)
+        prompt_stats.record(messages, max_tokens, mode)
+        logger.debug("准备调用ARK服务，模型: %s，max_tokens: %d", self.model_name, max_tokens)
+        started_at = time.time()
         retries = 0
         while retries < max_retries:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            attempt_started = time.perf_counter()
             try:
-                print(f"处理问题: {question}")
-                # 构建提示词（保持原逻辑，确保回答符合AI产品经理指南）
-                prompt = f"{AI_PRODUCT_MANAGER_PROMPT}\n\n类别: {category}\n问题: {question}"
-                
-                print(f"准备调用ARK服务，模型: {self.model_name}")
-                print(f"准备发送的prompt长度: {len(prompt)} 字符")
-                
                 # 调用ARK服务（修改为与test_direct_api_call.py相同的格式）
                 response = self.client.chat.completions.create(
                     model=self.model_name,  # ARK的推理接入点ID（不变）
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    max_tokens=3000,  # 保持原配置
+                    messages=messages,
+                    max_tokens=max_tokens,
                     temperature=0.8   # 保持原配置（控制回答随机性）
                 )
-                
-                print(f"API调用成功，响应类型: {type(response)}")
-                print(f"响应属性: {dir(response)}")
+                served_model, served_mock = self._served()
+                self._observe_request("sync", "ok", attempt_started, served_model)
+                self._record_usage(getattr(response, "usage", None), mode, served_model)
                 
                 # 提取回答（适配openai的响应格式）
                 # 注意：真实API响应中，回答在response.choices[0].message.content中
-                if hasattr(response, 'choices'):
-                    print(f"响应包含choices，数量: {len(response.choices) if hasattr(response.choices, '__len__') else '未知'}")
-                    if response.choices and hasattr(response.choices[0], 'message'):
-                        answer = response.choices[0].message.content
-                        print(f"成功提取回答，长度: {len(answer)} 字符")
-                        return True, answer
-                    else:
-                        print("无法提取回答: choices为空或没有message属性")
-                        # 兼容可能的不同响应格式
-                        return False, "无法提取AI回答，请检查响应格式"
-                else:
-                    print("响应不包含choices属性")
-                    # 打印完整响应以便调试
-                    print(f"完整响应: {response}")
-                    return False, "无法提取AI回答，请检查响应格式"
+                choices = getattr(response, "choices", None)
+                if choices and hasattr(choices[0], 'message'):
+                    answer = choices[0].message.content
+                    logger.debug("成功提取回答，长度: %d 字符", len(answer or ""))
+                    if getattr(choices[0], "finish_reason", None) == "length":
+                        # 达到输出上限被截断：不缓存，也不作为成功结果返回（避免被保存为卡片）
+                        prompt_stats.record_truncated(mode)
+                        logger.warning("回答达到输出上限被截断（max_tokens=%d）: %s", max_tokens, question)
+                        return False, f"回答超出输出上限（max_tokens={max_tokens}）被截断，不能保存为卡片"
+                    if cache_key and answer and self._cacheable(served_model, served_mock):
+                        self.cache.put(cache_key, answer, latency=time.time() - started_at)
+                    return True, answer
+                # 兼容可能的不同响应格式
+                logger.warning("无法提取回答，响应类型: %s", type(response).__name__)
+                logger.debug("完整响应: %r", response)
+                return False, "无法提取AI回答，请检查响应格式"
 
-                
             # 5. 异常处理：捕获openai库的常见异常（重试逻辑不变）
-            except (APIError, APIConnectionError, RateLimitError) as e:
+            except openai_errors() as e:
                 retries += 1
                 error_msg = f"调用ARK服务失败 (尝试 {retries}/{max_retries}): {str(e)}"
-                print(error_msg)
-                if retries >= max_retries:
-                    return False, error_msg
-                time.sleep(2 ** retries)  # 指数退避重试
             except Exception as e:
                 retries += 1
                 error_msg = f"未知错误 (尝试 {retries}/{max_retries}): {str(e)}"
-                print(error_msg)
+            self._observe_request("sync", "error", attempt_started)
+            logger.warning(error_msg)
+            if retries >= max_retries:
+                return False, error_msg
+            metrics.inc("llm_retries_total", model=self.model_name, mode="sync")
+            time.sleep(backoff_delay(retries, self.backoff_scale))  # 带抖动的指数退避重试
+
+    def generate_answer_stream(self, question, category="AI产品经理面试", max_retries=3, mode=DETAILED):
+        """流式生成回答：逐段产出增量文本，供 st.write_stream 渐进渲染。
+        只在收到第一个分片之前重试；重试耗尽时抛出 RuntimeError。
+        回答达到输出上限被截断时，已产出的内容不写入缓存，结束时抛出 prompts.AnswerTruncated"""
+        if not self.client:
+            self.initialize_client()
+            if not self.client:
+                raise RuntimeError("无法初始化AI客户端，请检查API密钥是否正确")
+        
+        cache_key = self._cache_key(question, category, mode)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        messages, max_tokens = build_messages(question, category, mode)
+        prompt_stats.record(messages, max_tokens, mode)
+        started_at = time.time()
+        parts = []
+        retries = 0
+        while True:
+            started = False
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            attempt_started = time.perf_counter()
+            finish_reason = None
+            try:
+                stream = self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=0.8,
+                    stream=True,
+                    stream_options={"include_usage": True}  # 最后一个分片携带token用量
+                )
+                served_model, served_mock = self._served()
+                for chunk in stream:
+                    self._record_usage(getattr(chunk, "usage", None), mode, served_model)
+                    if not chunk.choices:
+                        continue
+                    finish_reason = getattr(chunk.choices[0], "finish_reason", None) or finish_reason
+                    delta = getattr(chunk.choices[0].delta, "content", None)
+                    if delta:
+                        if not started:
+                            metrics.observe("llm_ttft_seconds", time.perf_counter() - attempt_started,
+                                            model=served_model)
+                        started = True
+                        parts.append(delta)
+                        yield delta
+                self._observe_request("stream", "ok", attempt_started, served_model)
+            except Exception as e:
+                self._observe_request("stream", "error", attempt_started)
+                # 已经输出了部分内容时无法透明重试，直接向上抛出
+                if started:
+                    raise
+                retries += 1
+                error_msg = f"调用ARK服务失败 (尝试 {retries}/{max_retries}): {str(e)}"
+                logger.warning(error_msg)
                 if retries >= max_retries:
-                    return False, error_msg
-                time.sleep(2 ** retries)
+                    raise RuntimeError(error_msg) from e
+                metrics.inc("llm_retries_total", model=self.model_name, mode="stream")
+                time.sleep(backoff_delay(retries, self.backoff_scale))
+                continue
+            if finish_reason == "length":
+                prompt_stats.record_truncated(mode)
+                logger.warning("回答达到输出上限被截断（max_tokens=%d）: %s", max_tokens, question)
+                raise AnswerTruncated(f"回答超出输出上限（max_tokens={max_tokens}）被截断，不能保存为卡片")
+            if cache_key and parts and self._cacheable(served_model, served_mock):
+                self.cache.put(cache_key, "".join(parts), latency=time.time() - started_at)
+            return
 
-# QA保存器（完全不变，保留原功能）
+# QA保存器：与app.py共用同一个卡片存储（open_store 按 CARD_STORE_BACKEND 选择后端）这一条写入路径
 class QASaver:
-    def __init__(self, data_file="questions&answers.json"):
+    def __init__(self, data_file=None, store=None):
+        """data_file 指定时固定使用该JSON卡片库，否则与app.py一样按配置打开"""
         self.data_file = data_file
-        self.initialize_data_file()
-    
-    def initialize_data_file(self):
-        if not os.path.exists(self.data_file):
-            with open(self.data_file, "w", encoding="utf-8") as f:
-                json.dump([], f, ensure_ascii=False, indent=2)
-        else:
-            try:
-                with open(self.data_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                if not isinstance(data, list):
-                    data = []
-                with open(self.data_file, "w", encoding="utf-8") as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
-            except json.JSONDecodeError:
-                with open(self.data_file, "w", encoding="utf-8") as f:
-                    json.dump([], f, ensure_ascii=False, indent=2)
+        self._store = store
+
+    @property
+    def store(self):
+        """首次保存时才打开卡片存储，打开时只读不写"""
+        if self._store is None:
+            self._store = CardStore(self.data_file) if self.data_file else open_store()
+        return self._store
     
     def save_qa(self, question, answer, category):
         try:
-            with open(self.data_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if not isinstance(data, list):
-                data = []
-            current_time = int(time.time())
-            qa_id = f"q_{len(data)}_{current_time}"
-            new_qa = {
-                "id": qa_id,
-                "category": category,
-                "question": question,
-                "status": "completed",
-                "answer": answer
-            }
-            data.append(new_qa)
-            with open(self.data_file, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.store.add(question, answer, category)
             return True, f"问答已保存到 '{category}' 分类"
         except Exception as e:
             return False, f"保存问答失败: {str(e)}"
 
-# 单例模式（不变，供app.py调用）
-aiclient = AIClient()
-qasaver = QASaver()
+# 单例模式（首次访问时才创建，供app.py调用）
+_singletons = {}
+_singletons_lock = threading.Lock()
+
+
+def get_aiclient():
+    with _singletons_lock:
+        if "aiclient" not in _singletons:
+            _singletons["aiclient"] = AIClient(cache=AnswerCache())
+        return _singletons["aiclient"]
+
+
+def get_qasaver():
+    with _singletons_lock:
+        if "qasaver" not in _singletons:
+            _singletons["qasaver"] = QASaver()
+        return _singletons["qasaver"]
+
+
+def __getattr__(name):
+    """兼容 `from ai_backend import aiclient, qasaver`：访问时才创建单例"""
+    if name == "aiclient":
+        return get_aiclient()
+    if name == "qasaver":
+        return get_qasaver()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # 测试代码（可选，本地运行验证）
+# 批量模式: python ai_backend.py --batch questions.jsonl --concurrency 8 --rate 5 --checkpoint batch.ckpt
+# 离线压测: python ai_backend.py --batch questions.txt --mock-latency 0.5 --mock-failure-rate 0.1
 if __name__ == "__main__":
-    success, result = aiclient.generate_answer("什么是AI产品经理？", "技术原理与基础概念")
-    if success:
-        print(f"AI回答:\n{result}")
-        save_success, save_msg = qasaver.save_qa("什么是AI产品经理？", result, "技术原理与基础概念")
-        print(save_msg)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="AI产品经理学习助手后端")
+    parser.add_argument("--batch", help="问题列表文件（.jsonl 每行含question/category，其他格式每行一个问题）")
+    parser.add_argument("--category", default="技术原理与基础概念", help="未指定类别时使用的默认类别")
+    parser.add_argument("--concurrency", type=int, default=4, help="最大并发请求数")
+    parser.add_argument("--rate", type=float, default=2.0, help="每秒最多发出的请求数")
+    parser.add_argument("--checkpoint", help="检查点文件，中断后用同一文件续跑")
+    parser.add_argument("--mock-latency", type=float, help="使用MockArk并设置每次请求的模拟延迟（秒）")
+    parser.add_argument("--mock-failure-rate", type=float, default=0.0, help="MockArk模拟限流失败的概率")
+    parser.add_argument("--mode", choices=["detailed", "brief"], default=DETAILED, help="回答模式：详细/简要")
+    parser.add_argument("--log-level", default=os.environ.get("LOG_LEVEL", "INFO"), help="日志级别，如 DEBUG/INFO/WARNING")
+    parser.add_argument("--metrics-jsonl", help="结束时把调用指标快照追加到该JSONL文件")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.batch:
+        from batch import TokenBucket, load_questions, run_batch
+
+        client = AIClient(cache=get_aiclient().cache, rate_limiter=TokenBucket(args.rate))
+        if args.mock_latency is None and getattr(client.client, "is_mock", False):
+            parser.error("未配置 ARK_API_KEY 或 MODEL_POOL_CONFIG，只能使用模拟客户端，模拟回答不能写入卡片库；"
+                         "离线压测请指定 --mock-latency")
+        store = get_qasaver().store
+        if args.mock_latency is not None:
+            # 离线压测只衡量吞吐，模拟回答不写入卡片库，也不记检查点（否则之后的真实运行会跳过这些问题）
+            client.client = MockArk(latency=args.mock_latency, failure_rate=args.mock_failure_rate)
+            client.backoff_scale = 0.05
+            store = None
+        questions = load_questions(args.batch, args.category)
+        stats = run_batch(client, questions, store=store, concurrency=args.concurrency,
+                          checkpoint=args.checkpoint, mode=args.mode)
+        for question, error in stats.pop("errors"):
+            print(f"失败: {question} -> {error}")
+        print(stats)
+        print(prompt_stats.stats())
     else:
-        print(f"生成回答失败: {result}")
+        success, result = get_aiclient().generate_answer("什么是AI产品经理？", "技术原理与基础概念", mode=args.mode)
+        if success:
+            print(f"AI回答:\n{result}")
+            if getattr(get_aiclient().client, "is_mock", False):
+                print("模拟客户端的回答不保存为卡片")
+            else:
+                save_success, save_msg = get_qasaver().save_qa("什么是AI产品经理？", result, "技术原理与基础概念")
+                print(save_msg)
+        else:
+            print(f"生成回答失败: {result}")
+    if args.metrics_jsonl:
+        metrics.write_jsonl(args.metrics_jsonl)
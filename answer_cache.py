@@ -0,0 +1,138 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from metrics import metrics
+
+# AI回答的持久化缓存：相同（模型, 指南prompt, 类别, 规范化后的问题）直接返回已有回答，
+# 省去一次付费的LLM调用。存放在本地SQLite文件中，按TTL过期、按总大小做LRU淘汰
+
+CACHE_FILE = "answer_cache.sqlite3"
+
+_TRAILING_PUNCT_RE = re.compile(r"[\s?？。.!！,，;；:：]+$")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    """全半角统一、小写、合并空白、去掉结尾标点，让仅有格式差异的问题命中同一条缓存"""
+    text = unicodedata.normalize("NFKC", question).lower().strip()
+    text = _SPACE_RE.sub(" ", text)
+    return _TRAILING_PUNCT_RE.sub("", text)
+
+
+def make_key(model_name, prompt, category, question):
+    payload = json.dumps([model_name, prompt, category, normalize_question(question)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    def __init__(self, path=CACHE_FILE, max_bytes=50 * 1024 * 1024, ttl=30 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0  # 命中时节省的生成耗时（按当初生成该回答的耗时估算）
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, answer TEXT NOT NULL, size INTEGER NOT NULL, "
+            "latency REAL NOT NULL DEFAULT 0, created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_last_access ON answers(last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, latency, created FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl and now - row[2] > self.ttl):
+                self.misses += 1
+                metrics.inc("answer_cache_lookups_total", result="miss")
+                return None
+            self._conn.execute("UPDATE answers SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            self.saved_seconds += row[1]
+            metrics.inc("answer_cache_lookups_total", result="hit")
+            return row[0]
+
+    def put(self, key, answer, latency=0.0):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, size, latency, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, answer, len(answer.encode("utf-8")), latency, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        if self.ttl:
+            self._conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # 按最近访问时间从旧到新淘汰，直到总大小回到上限以内
+        for key, size in self._conn.execute("SELECT key, size FROM answers ORDER BY last_access").fetchall():
+            self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def prewarm(self, store, model_name, prompt):
+        """用卡片库中已保存的卡片预热缓存（已存在的键不覆盖），返回新增条数。
+        回答正文通过 store.answer 读取（PackedCardStore 的卡片列表不带回答）"""
+        added = 0
+        for card in store.all_cards():
+            if not card.get("question"):
+                continue
+            key = make_key(model_name, prompt, card["category"], card["question"])
+            with self._lock:
+                exists = self._conn.execute("SELECT 1 FROM answers WHERE key = ?", (key,)).fetchone()
+            if exists:
+                continue
+            answer = store.answer(card["id"])
+            if answer:
+                self.put(key, answer)
+                added += 1
+        return added
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+            "saved_seconds": round(self.saved_seconds, 2),
+        }
+
+
+if __name__ == "__main__":
+    import sys
+
+    # 用法: python answer_cache.py prewarm   用卡片库（CARD_STORE_BACKEND 指定的后端）中的卡片预热缓存
+    #       python answer_cache.py stats
+    from ai_backend import DEFAULT_MODEL
+    from prompts import AI_PRODUCT_MANAGER_PROMPT
+    from storage import open_store
+
+    cache = AnswerCache()
+    if len(sys.argv) >= 2 and sys.argv[1] == "prewarm":
+        count = cache.prewarm(open_store(), DEFAULT_MODEL, AI_PRODUCT_MANAGER_PROMPT)
+        print(f"已预热 {count} 条回答")
+    print(cache.stats())
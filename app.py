@@ -5,33 +5,40 @@ os.environ['STREAMLIT_DISABLE_FILE_WATCHING'] = 'true'
 
 import streamlit as st
 import json
-from datetime import datetime
-import uuid
+import logging
 import sys
 import time
 
+from jobs import DONE, FAILED, TRUNCATED, JobQueue
+from metrics import metrics, serve as serve_metrics
+from prompts import DETAILED, MODES, prompt_stats
+from review import GRADES, ReviewScheduler
+from search import SearchIndex, make_snippet
+from similar import SimilarityIndex
+from storage import ConflictError, open_store
+
+# 调试信息走日志级别：生产环境默认WARNING，排查问题时设置 LOG_LEVEL=DEBUG
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING").upper())
+
 # 注意：在Streamlit Cloud环境中，API密钥通过secrets提供，而不是.env文件
 # 以下代码已优化以适应Streamlit Cloud环境
 
 # 尝试导入ai_backend模块，如果失败提供替代方案
 class MockAIClient:
-    def generate_answer(self, question, category="AI产品经理面试", max_retries=3):
+    def generate_answer(self, question, category="AI产品经理面试", max_retries=3, mode=DETAILED):
         return True, "当前环境无法连接到AI服务。这是一个示例回答，展示了AI产品经理学习助手的基本功能。\n\n请配置环境变量ARK_API_KEY以获取完整的AI回答能力。"
 
-class MockQASaver:
-    def save_qa(self, question, answer, category):
-        return True, "本地保存功能已启用" # 修改为更友好的提示
+    def generate_answer_stream(self, question, category="AI产品经理面试", max_retries=3, mode=DETAILED):
+        yield self.generate_answer(question, category)[1]
 
 # 检查环境变量中是否设置了API密钥
 has_api_key = 'ARK_API_KEY' in os.environ and os.environ['ARK_API_KEY']
 
 # 无论是否有API密钥，都尝试导入ai_backend模块
 try:
-    from ai_backend import aiclient, qasaver
-    # 如果没有API密钥，使用模拟对象
-    if not has_api_key:
-        aiclient = MockAIClient()
-        qasaver = MockQASaver()
+    import ai_backend
+    # 没有API密钥时使用模拟对象，不创建真实客户端（ai_backend 的单例在首次访问时才构造）
+    aiclient = ai_backend.aiclient if has_api_key or os.environ.get("MODEL_POOL_CONFIG") else MockAIClient()
     st.session_state["ai_backend_available"] = True  # 只要能导入ai_backend，就认为可用
     st.session_state["has_api_key"] = has_api_key
     st.session_state["aiclient_type"] = type(aiclient).__name__  # 记录aiclient的类型以便调试
@@ -40,7 +47,6 @@ except ImportError as e:
     st.warning(f"无法导入ai_backend模块: {str(e)}，将使用基础功能模式")
     # 使用模拟对象
     aiclient = MockAIClient()
-    qasaver = MockQASaver()
     st.session_state["ai_backend_available"] = False
     st.session_state["has_api_key"] = has_api_key
     st.session_state["aiclient_type"] = "MockAIClient"
@@ -56,131 +62,145 @@ page = st.sidebar.radio(
     "选择功能:",
     ["AI解答", "技术原理与基础概念", "产品设计与用户体验",
      "产品落地与工程实践", "特定场景与行业应用",
-     "团队协作与职业发展", "重点标注学习"]
+     "团队协作与职业发展", "重点标注学习", "运行指标"]
 )
 
-DATA_FILE = "questions&answers.json"
+PAGE_SIZE_OPTIONS = [10, 20, 50]
+SEARCH_LIMIT = 200  # 检索只取相关度最高的前N个，结果再分页展示
 
-# 使用缓存来减少文件读取频率
-_data_cache = None
-_last_cache_time = 0
-CACHE_DURATION = 5  # 缓存持续时间（秒）
 
+@st.cache_resource
+def get_store():
+    """进程级共享的卡片存储，跨rerun和会话复用，只在数据被改动时重新读取。
+    设置环境变量 CARD_STORE_BACKEND=sqlite 时使用SQLite后端"""
+    return open_store()
 
-def read_data():
-    global _data_cache, _last_cache_time
-    current_time = time.time()
-    
-    # 检查缓存是否有效
-    if _data_cache and (current_time - _last_cache_time) < CACHE_DURATION:
-        return _data_cache
-    
-    try:
-        if not os.path.exists(DATA_FILE):
-            result = {
-                "AI解答": [],
-                "技术原理与基础概念": [],
-                "产品设计与用户体验": [],
-                "产品落地与工程实践": [],
-                "特定场景与行业应用": [],
-                "团队协作与职业发展": [],
-                "重点标注学习": []
-            }
-            # 缓存结果
-            _data_cache = result
-            _last_cache_time = current_time
-            return result
-        
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        categorized_data = {
-            "AI解答": [],
-            "技术原理与基础概念": [],
-            "产品设计与用户体验": [],
-            "产品落地与工程实践": [],
-            "特定场景与行业应用": [],
-            "团队协作与职业发展": [],
-            "重点标注学习": []
-        }
-        
-        for item in data:
-            if isinstance(item, dict):
-                category = item.get("category", "AI解答")
-                qa_item = {
-                    "id": item.get("id", str(uuid.uuid4())),
-                    "question": item.get("question", ""),
-                    "answer": item.get("answer", ""),
-                    "category": category,
-                    "timestamp": item.get("timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
-                    "starred": item.get("starred", False)
-                }
-                if category in categorized_data:
-                    categorized_data[category].append(qa_item)
-        
-        starred_items = []
-        for cat in ["技术原理与基础概念", "产品设计与用户体验", "产品落地与工程实践", "特定场景与行业应用", "团队协作与职业发展"]:
-            for item in categorized_data[cat]:
-                if item.get("starred"):
-                    starred_items.append(item)
-        categorized_data["重点标注学习"] = starred_items
-        
-        # 缓存结果
-        _data_cache = categorized_data
-        _last_cache_time = current_time
-        return categorized_data
-    except Exception as e:
-        st.error(f"读取数据时出错: {str(e)}")
-        result = {
-            "AI解答": [],
-            "技术原理与基础概念": [],
-            "产品设计与用户体验": [],
-            "产品落地与工程实践": [],
-            "特定场景与行业应用": [],
-            "团队协作与职业发展": [],
-            "重点标注学习": []
-        }
-        return result
-
-
-def save_data(data):
-    global _data_cache, _last_cache_time
-    all_items = []
-    
+
+@st.cache_resource
+def get_search_index():
+    """全文检索索引与store一样进程级共享，随store的写入增量更新；SQLite后端直接使用自带的FTS5"""
+    store = get_store()
+    if hasattr(store, "search"):
+        return store
+    return SearchIndex(store)
+
+
+@st.cache_resource
+def get_similarity_index():
+    """相似问题向量索引，进程级共享，随store的写入增量更新"""
+    return SimilarityIndex(get_store())
+
+
+@st.cache_resource
+def get_review_scheduler():
+    """收藏卡片的复习队列，进程级共享，随store的收藏/增删增量更新"""
+    return ReviewScheduler(get_store())
+
+
+@st.cache_resource
+def get_metrics_server():
+    """设置环境变量 METRICS_PORT 时，在本机该端口提供 /metrics（Prometheus文本格式），进程内只启动一次"""
+    port = os.environ.get("METRICS_PORT")
+    return serve_metrics(int(port)) if port else None
+
+
+@st.cache_resource
+def get_job_queue():
+    """后台问答任务队列，进程级共享；任务在rerun和页面切换之间继续运行"""
+    return JobQueue(aiclient)
+
+
+store = get_store()
+get_metrics_server()
+
+
+def update_card(operation, item, *args):
+    """带版本检查地修改卡片：卡片在本页渲染后已被其他会话修改时只提示冲突，不覆盖对方的修改"""
+    seen_version = st.session_state["seen_versions"].get(item["id"], item["version"])
     try:
-        for category, items in data.items():
-            if category != "重点标注学习":
-                for item in items:
-                    qa_item = {
-                        "id": item["id"],
-                        "category": item["category"],
-                        "question": item["question"],
-                        "answer": item["answer"],
-                        "timestamp": item.get("timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
-                        "starred": item.get("starred", False)
-                    }
-                    all_items.append(qa_item)
-        
-        # 确保目录存在
-        os.makedirs(os.path.dirname(DATA_FILE) if os.path.dirname(DATA_FILE) else '.', exist_ok=True)
-        
-        # 写入文件
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(all_items, f, ensure_ascii=False, indent=2)
-        
-        # 清除缓存，下次读取时更新
-        _data_cache = None
-        _last_cache_time = 0
-        
-    except Exception as e:
-        st.error(f"保存数据时出错: {str(e)}")
+        operation(item["id"], *args, expected_version=seen_version)
+        return True
+    except ConflictError:
+        st.warning("该卡片已被其他会话修改，请刷新页面后重新操作")
+        return False
+
+
+def format_interval(days):
+    if days < 1:
+        return f"{max(1, round(days * 24 * 60))}分钟"
+    return f"{round(days, 1):g}天" if days < 30 else f"{days / 30:.1f}个月"
+
+
+def render_review(scheduler):
+    """复习模式：按到期时间依次取出收藏卡片，先回忆、再查看回答并评分，评分决定下次复习时间"""
+    now = time.time()
+    st.subheader(f"🔁 今日复习（到期 {scheduler.due_count(now)} 张）")
+    card_id = scheduler.next_due(now)
+    card = store.get(card_id) if card_id else None
+    if card is None:
+        next_at = scheduler.next_review_at()
+        if next_at is None:
+            st.info("收藏卡片后即可开始复习")
+        else:
+            st.success(f"暂无到期卡片，下次复习时间: {time.strftime('%Y-%m-%d %H:%M', time.localtime(next_at))}")
+        return
+    st.markdown(f"**{card['question']}**（{card['category']}）")
+    if st.toggle("显示回答", key=f"review_show_{card_id}"):
+        st.markdown(store.answer(card_id) or "")
+        st.caption("按回忆的情况评分：")
+        columns = st.columns(len(GRADES))
+        for column, (grade, days) in zip(columns, scheduler.preview(card_id, now).items()):
+            with column:
+                if st.button(f"{GRADES[grade]}（{format_interval(days)}后）", key=f"review_{grade}_{card_id}",
+                             use_container_width=True):
+                    scheduler.review(card_id, grade)
+                    st.rerun()
+
+
+def render_jobs(jobs, polling=False):
+    """展示本会话的提问任务：进行中的显示已生成的部分，完成的可保存为卡片。
+    polling 为 True 时本函数作为定时刷新的局部片段运行"""
+    if not jobs:
+        return
+    if polling and not any(job.pending for job in jobs):
+        # run_every 在注册片段时就已固定，任务全部结束后整页重跑一次，按不轮询重新注册
+        st.rerun(scope="app")
+    st.subheader("AI回答:")
+    for job in jobs:
+        if job.status == FAILED:
+            st.error(f"获取AI回答失败（{job.question}）: {job.error}")
+            continue
+        if job.status == DONE:
+            title = job.question
+        elif job.status == TRUNCATED:
+            title = f"⚠️ {job.question}（回答不完整）"
+        else:
+            title = f"⏳ {job.question}（生成中…）"
+        with st.expander(title, expanded=job is jobs[0]):
+            st.write(job.partial or "AI正在思考中...")
+            if job.status == TRUNCATED:
+                st.warning(job.error)
+            if job.status == DONE:
+                if st.button("保存卡片", key=f"save_{job.id}", use_container_width=True):
+                    try:
+                        # 只通过store写入一次（追加一条日志），不再重复保存第二份
+                        store.add(job.question, job.result, job.category)
+                        st.success(f"问答已保存到 '{job.category}' 分类（知识卡片保存成功！）")
+                    except Exception as e:
+                        st.error(f"保存卡片时发生错误: {str(e)}")
 
-for key in ["current_question", "current_answer", "current_category", "ai_answered"]:
+
+for key in ["current_question", "current_category"]:
     if key not in st.session_state:
         st.session_state[key] = ""
 
-if "ai_answered" not in st.session_state:
-    st.session_state["ai_answered"] = False
+# 本会话提交过的后台任务id（新的在前），跨rerun和页面切换保留
+if "job_ids" not in st.session_state:
+    st.session_state["job_ids"] = []
+
+# 本会话上次渲染时看到的卡片版本号，点击按钮时用于检测并发修改
+if "seen_versions" not in st.session_state:
+    st.session_state["seen_versions"] = {}
 
 if page == "AI解答":
     st.title("💡 AI解答")
@@ -203,128 +223,178 @@ if page == "AI解答":
                )
     )
 
+    # 简要模式的输出上限更低，生成更快、更省token
+    mode = st.radio("回答模式:", list(MODES), format_func=MODES.get, horizontal=True, key="answer_mode")
+
+    # 提问前先展示已有的相似卡片，已有答案时无需再发起付费的AI调用
+    if question.strip():
+        similar_cards = get_similarity_index().similar(question, k=3)
+        if similar_cards:
+            st.info("发现相似的已有卡片，可先查看：")
+            for card, score in similar_cards:
+                with st.expander(f"📎 {card['question']}（{card['category']}，相似度 {score:.0%}）"):
+                    st.markdown(store.answer(card["id"]) or "")
+
     if st.button("向AI提问", key="ask_ai", use_container_width=True):
         if question.strip():
-            with st.spinner("AI正在思考中..."):
-                try:
-                    success, result = aiclient.generate_answer(question, category)
-                    if success:
-                        st.session_state["current_question"] = question
-                        st.session_state["current_answer"] = result
-                        st.session_state["current_category"] = category
-                        st.session_state["ai_answered"] = True
-                    else:
-                        st.error(f"获取AI回答失败: {result}")
-                        st.session_state["ai_answered"] = False
-                except Exception as e:
-                    st.error(f"调用AI后端时发生错误: {str(e)}")
-                    st.session_state["ai_answered"] = False
+            # 提交到后台任务队列后立即返回，可以连续提交多个问题
+            job_id = get_job_queue().submit(question, category, mode)
+            st.session_state["job_ids"].insert(0, job_id)
+            st.session_state["current_question"] = question
+            st.session_state["current_category"] = category
         else:
             st.warning("请输入问题后再提问")
-            st.session_state["ai_answered"] = False
-
-    if st.session_state.get("ai_answered", False) and st.session_state.get("current_answer", ""):
-        st.subheader("AI回答:")
-        st.write(st.session_state["current_answer"])
-
-        if st.button("保存卡片", key="save_card", use_container_width=True):
-            try:
-                data = read_data()
-                new_item = {
-                    "id": str(uuid.uuid4()),
-                    "question": st.session_state["current_question"],
-                    "answer": st.session_state["current_answer"],
-                    "category": st.session_state["current_category"],
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "starred": False
-                }
-                data[st.session_state["current_category"]].append(new_item)
-                save_data(data)
-                try:
-                    save_success, save_msg = qasaver.save_qa(
-                        st.session_state["current_question"],
-                        st.session_state["current_answer"],
-                        st.session_state["current_category"]
-                    )
-                    if save_success:
-                        st.success(f"{save_msg}（知识卡片保存成功！）")
-                    else:
-                        st.warning("本地保存成功，但后端保存失败: " + str(save_msg))
-                except Exception as e:
-                    st.warning("本地保存成功，但后端接口异常: " + str(e))
-                # 保存后不清空内容
-            except Exception as e:
-                st.error(f"保存卡片时发生错误: {str(e)}")
+
+    jobs = [job for job in (get_job_queue().get(job_id) for job_id in st.session_state["job_ids"]) if job]
+    # 有未完成的任务时每秒局部刷新一次任务列表，全部完成后停止轮询
+    poll_interval = 1 if any(job.pending for job in jobs) else None
+    st.fragment(render_jobs, run_every=poll_interval)(jobs, polling=poll_interval is not None)
+
+elif page == "运行指标":
+    st.title("📈 运行指标")
+    snapshot = metrics.snapshot()
+    st.caption(f"自进程启动（或上次重置）以来 {snapshot['uptime']:.0f} 秒内的统计，分位数按直方图桶上界估算")
+    if snapshot["histograms"]:
+        st.subheader("耗时分布（秒）")
+        st.dataframe([{"指标": h["name"], "标签": ", ".join(f"{k}={v}" for k, v in h["labels"].items()),
+                       "次数": h["count"], "总耗时": h["sum"], "p50": h["p50"], "p95": h["p95"], "p99": h["p99"]}
+                      for h in snapshot["histograms"]], use_container_width=True)
+    if snapshot["counters"]:
+        st.subheader("计数")
+        st.dataframe([{"指标": c["name"], "标签": ", ".join(f"{k}={v}" for k, v in c["labels"].items()),
+                       "值": c["value"]} for c in snapshot["counters"]], use_container_width=True)
+    budget = prompt_stats.stats()
+    if budget["requests"]:
+        st.subheader("提示词与token预算")
+        st.caption(
+            f"共 {budget['requests']} 次请求（{', '.join(f'{MODES[m]} {n}' for m, n in budget['by_mode'].items())}），"
+            f"本地估算输入 {budget['prompt_tokens_estimated']} tokens，其中可被前缀缓存复用 {budget['cacheable_prefix_tokens']}，"
+            f"服务端报告缓存命中 {budget['server_cached_tokens']}；"
+            f"输出上限合计 {budget['max_tokens_budget']}（固定3000时为 {budget['legacy_max_tokens_budget']}），"
+            f"服务端报告的单次最大输出 "
+            f"{', '.join(f'{MODES[m]} {n}' for m, n in budget['max_completion_tokens'].items())}，"
+            f"达到上限被截断 {sum(budget['truncated'].values())} 次"
+        )
+    pool = getattr(aiclient, "client", None)
+    if hasattr(pool, "backends"):
+        st.subheader("模型池")
+        st.dataframe(pool.status(), use_container_width=True)
+    if not snapshot["histograms"] and not snapshot["counters"]:
+        st.info("暂无指标数据")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button("下载Prometheus文本", metrics.render_prometheus(), file_name="metrics.prom",
+                           use_container_width=True)
+    with col2:
+        st.download_button("下载JSONL快照", json.dumps(snapshot, ensure_ascii=False) + "\n",
+                           file_name="metrics.jsonl", use_container_width=True)
+    with col3:
+        if st.button("重置指标", use_container_width=True):
+            metrics.reset()
+            st.rerun()
+    if os.environ.get("METRICS_PORT"):
+        st.caption(f"Prometheus抓取地址: http://127.0.0.1:{os.environ['METRICS_PORT']}/metrics")
 
 else:
+    render_started = time.perf_counter()
     st.title(f"📖 {page}")
-    data = read_data()
-    category_items = data.get(page, [])
-    category_items.sort(key=lambda x: x["timestamp"], reverse=True)
-    st.write(f"共 {len(category_items)} 个学习卡片")
+    try:
+        store.refresh()
+    except Exception as e:
+        st.error(f"读取数据时出错: {str(e)}")
+    if page == "重点标注学习":
+        scheduler = get_review_scheduler()
+        render_review(scheduler)
+        st.markdown("---")
+    st.write(f"共 {store.count(page)} 个学习卡片")
     search_query = st.text_input("搜索问题:")
     if search_query:
-        filtered_items = [
-            item for item in category_items
-            if search_query.lower() in item["question"].lower() or
-               search_query.lower() in item["answer"].lower()
-        ]
+        # 通过倒排索引检索，按相关度排序
+        filtered_items = [card for card, _ in
+                          get_search_index().search(search_query, category=page, limit=SEARCH_LIMIT)]
+        total_items = len(filtered_items)
+        if total_items >= SEARCH_LIMIT:
+            st.write(f"相关卡片较多，显示相关度最高的 {SEARCH_LIMIT} 个")
+        else:
+            st.write(f"找到 {total_items} 个相关卡片")
     else:
-        filtered_items = category_items
-    if search_query:
-        st.write(f"找到 {len(filtered_items)} 个相关卡片")
-    if filtered_items:
-        for item in filtered_items:
+        filtered_items = None
+        total_items = store.count(page)
+    if total_items:
+        # 分页：每次只渲染一页卡片，渲染量不再随卡片总数线性增长
+        col_size, col_page = st.columns(2)
+        with col_size:
+            page_size = st.selectbox("每页卡片数:", PAGE_SIZE_OPTIONS, index=1, key=f"page_size_{page}")
+        total_pages = max(1, (total_items + page_size - 1) // page_size)
+        with col_page:
+            page_no = st.number_input(f"页码（共 {total_pages} 页）:", min_value=1, max_value=total_pages,
+                                      value=1, step=1, key=f"page_no_{page}_{search_query}")
+        start = (page_no - 1) * page_size
+        if filtered_items is None:
+            # 只取当前页的卡片（SQLite后端只读取这些行）
+            page_items = store.page(page, start, page_size)
+        else:
+            page_items = filtered_items[start:start + page_size]
+        for item in page_items:
+            if search_query:
+                st.caption(make_snippet(store.answer(item["id"]) or "", search_query))
             # 将问题标题作为expander的标题，让用户不需要展开就能看到
             with st.expander(f"⭐  {item['question']}"):
                 
                 # 将按钮移到正文上方，并调整收藏按钮在删除按钮之前
-                col1, col2 = st.columns(2)
+                col1, col2, col3 = st.columns(3)
                 with col1:
                     if page != "重点标注学习":
                         if item.get("starred", False):
                             if st.button("取消收藏", key=f"unstar_{item['id']}", use_container_width=True):
-                                for i in data[page]:
-                                    if i["id"] == item["id"]:
-                                        i["starred"] = False
-                                data["重点标注学习"] = [i for i in data["重点标注学习"] if i["id"] != item["id"]]
-                                save_data(data)
-                                st.success("已取消收藏！")
-                                st.rerun()
+                                if update_card(store.set_starred, item, False):
+                                    st.success("已取消收藏！")
+                                    st.rerun()
                         else:
                             if st.button("收藏", key=f"star_{item['id']}", use_container_width=True):
-                                for i in data[page]:
-                                    if i["id"] == item["id"]:
-                                        i["starred"] = True
-                                data["重点标注学习"].append(item)
-                                save_data(data)
-                                st.success("已收藏到重点标注学习！")
-                                st.rerun()
+                                if update_card(store.set_starred, item, True):
+                                    st.success("已收藏到重点标注学习！")
+                                    st.rerun()
                     else:
                         if st.button("取消收藏", key=f"unstar_{item['id']}", use_container_width=True):
-                            data["重点标注学习"] = [i for i in data["重点标注学习"] if i["id"] != item["id"]]
-                            for category in ["技术原理与基础概念", "产品设计与用户体验",
-                                             "产品落地与工程实践", "特定场景与行业应用",
-                                             "团队协作与职业发展"]:
-                                for i in data[category]:
-                                    if i["id"] == item["id"]:
-                                        i["starred"] = False
-                            save_data(data)
-                            st.success("已取消收藏！")
-                            st.rerun()
+                            if update_card(store.set_starred, item, False):
+                                st.success("已取消收藏！")
+                                st.rerun()
                 with col2:
                     if st.button("删除", key=f"delete_{item['id']}", use_container_width=True):
-                        data[page] = [i for i in data[page] if i["id"] != item["id"]]
-                        if item.get("starred", False) and page != "重点标注学习":
-                            data["重点标注学习"] = [i for i in data["重点标注学习"] if i["id"] != item["id"]]
-                        save_data(data)
-                        st.success("卡片已删除！")
-                        st.rerun()
-                # 正文内容移到按钮下方，使用更大的字体显示回答
-                st.markdown(f"<span style='font-size: 1.1rem;'>{item['answer']}</span>", unsafe_allow_html=True)
+                        if update_card(store.delete, item):
+                            st.success("卡片已删除！")
+                            st.rerun()
+                with col3:
+                    # 折叠的expander也会下发全部内容，因此回答正文只在用户打开时才从store取出渲染
+                    show_answer = st.toggle("显示回答", key=f"show_{item['id']}")
+                if show_answer:
+                    answer = store.answer(item["id"])
+                    if answer is not None:
+                        # 正文内容移到按钮下方，使用更大的字体显示回答
+                        st.markdown(f"<span style='font-size: 1.1rem;'>{answer}</span>", unsafe_allow_html=True)
                 st.caption(f"创建时间: {item['timestamp']}")
+                if page == "重点标注学习":
+                    review_state = scheduler.state(item["id"])
+                    if review_state["last_review"]:
+                        st.caption(
+                            f"已复习 {review_state['reps']} 轮，遗忘 {review_state['lapses']} 次，下次复习: "
+                            f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(review_state['due']))}"
+                        )
+            st.session_state["seen_versions"][item["id"]] = item["version"]
+        st.caption(
+            f"第 {page_no}/{total_pages} 页，本页 {len(page_items)} 张卡片，"
+            f"渲染耗时 {(time.perf_counter() - render_started) * 1000:.1f} ms"
+        )
     else:
         st.info("该分类下暂无学习卡片")
 
 st.sidebar.markdown("---")
+st.sidebar.caption(f"数据解析 {store.stats['parses']} 次，复用缓存 {store.stats['parses_avoided']} 次")
+if getattr(aiclient, "cache", None) is not None:
+    cache_stats = aiclient.cache.stats()
+    st.sidebar.caption(
+        f"回答缓存命中 {cache_stats['hits']} 次 / 未命中 {cache_stats['misses']} 次，"
+        f"节省约 {cache_stats['saved_seconds']} 秒"
+    )
 st.sidebar.info("AI产品经理学习助手 - 让知识触手可及")
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from prompts import DETAILED
+from storage import normalize_card, now_timestamp
+
+# 批量问答：线程池并发调用 AIClient，共享令牌桶限流，
+# 结果按批写入CardStore，并通过检查点文件支持中断后续跑。
+# 卡片id由问题导出，卡片库中已存在的卡片不重新生成、也不覆盖（保留收藏状态与原回答）
+
+DEFAULT_CATEGORY = "技术原理与基础概念"
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        """每秒补充 rate 个令牌，最多积攒 capacity 个（默认等于rate，至少1个）"""
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，没有可用令牌时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def question_key(question, category):
+    """问题的稳定标识，同时用作检查点记录和卡片id，保证重跑时写入是幂等的"""
+    digest = hashlib.sha1(f"{category}\n{question}".encode("utf-8")).hexdigest()[:16]
+    return f"batch_{digest}"
+
+
+def load_questions(path, default_category=DEFAULT_CATEGORY):
+    """读取问题列表：.jsonl 每行 {"question": ..., "category": ...}，其他文件每行一个问题"""
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                item = json.loads(line)
+                questions.append((item["question"], item.get("category") or default_category))
+            else:
+                questions.append((line, default_category))
+    return questions
+
+
+def _load_checkpoint(path):
+    done = set()
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    done.add(line)
+    return done
+
+
+def run_batch(client, questions, store=None, concurrency=4, checkpoint=None, flush_every=20, mode=DETAILED):
+    """并发回答 questions（[(question, category)]），mode 为回答模式（详细/简要），返回统计信息。
+    成功的结果每 flush_every 条批量写入 store，写入后再记检查点；重跑时跳过检查点中已完成的问题
+    以及 store 中已存在的卡片。store 为None（只压测吞吐）或 client 使用模拟客户端时
+    不写入卡片、也不写检查点，模拟回答不会占住这些问题"""
+    if getattr(getattr(client, "client", None), "is_mock", False):
+        store = None
+    done = _load_checkpoint(checkpoint)
+    pending = []
+    existing = 0
+    for question, category in questions:
+        key = question_key(question, category)
+        if key in done:
+            continue
+        done.add(key)  # 同一批次内的重复问题只跑一次
+        if store is not None and store.get(key) is not None:
+            existing += 1
+            continue
+        pending.append((key, question, category))
+
+    stats = {"total": len(questions), "skipped": len(questions) - len(pending) - existing,
+             "existing": existing, "succeeded": 0, "failed": 0, "errors": []}
+    buffer = []
+
+    def flush():
+        if not buffer:
+            return
+        if store is not None:
+            # 运行期间被其他进程写入的同id卡片同样不覆盖（在store的写锁内检查）
+            written = store.add_many(buffer, overwrite=False)
+            stats["existing"] += len(buffer) - len(written)
+            if checkpoint:
+                with open(checkpoint, "a", encoding="utf-8") as f:
+                    f.write("".join(card["id"] + "\n" for card in buffer))
+        buffer.clear()
+
+    started_at = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(client.generate_answer, question, category, mode=mode): (key, question, category)
+            for key, question, category in pending
+        }
+        for future in as_completed(futures):
+            key, question, category = futures[future]
+            try:
+                success, result = future.result()
+            except Exception as e:
+                success, result = False, str(e)
+            if not success:
+                stats["failed"] += 1
+                stats["errors"].append((question, result))
+                continue
+            stats["succeeded"] += 1
+            buffer.append(normalize_card({
+                "id": key,
+                "category": category,
+                "question": question,
+                "answer": result,
+                "timestamp": now_timestamp(),
+            }))
+            if len(buffer) >= flush_every:
+                flush()
+    flush()
+
+    elapsed = time.time() - started_at
+    stats["elapsed"] = round(elapsed, 3)
+    stats["throughput"] = round(stats["succeeded"] / elapsed, 3) if elapsed else 0.0
+    return stats
@@ -0,0 +1,168 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_backend import QASaver  # noqa: E402
+from corpus import CATEGORIES, card_ids, make_cards, write_json  # noqa: E402
+from packed_store import PackedCardStore, pack  # noqa: E402
+from search import SearchIndex  # noqa: E402
+from sqlite_store import SQLiteCardStore  # noqa: E402
+from storage import STARRED_VIEW, CardStore  # noqa: E402
+
+# JSON快照+日志后端、压缩打包快照后端 与 SQLite后端 的对比基准
+# 用法: python benchmarks/bench_backends.py --sizes 1000 10000 100000 --answer-chars 500 --output result.json
+
+PAGE_SIZE = 20
+QUERY = "评估体系"
+SHORT_QUERY = "幻觉"  # 两个字的词：SQLite后端的trigram索引无法检索，走二元组表
+SEARCH_LIMIT = 200  # 与 app.py 一致：检索只取前200个
+REPEAT = 20
+ROUNDS = 5  # 只能执行一次的场景（冷启动、建索引、写入后的第一次读）重复的轮数，取中位数
+
+
+def _timed(func, repeat=1):
+    """执行 repeat 次，返回平均耗时（毫秒）"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def _median_after(prepare, func, rounds=ROUNDS):
+    """每轮先执行 prepare()（不计时）再计时执行一次 func，返回各轮耗时的中位数（毫秒）"""
+    samples = []
+    for _ in range(rounds):
+        prepare()
+        samples.append(_timed(func))
+    return statistics.median(samples)
+
+
+def _generate(directory, size, answer_chars):
+    json_file = os.path.join(directory, "cards.json")
+    db_file = os.path.join(directory, "cards.sqlite3")
+    write_json(json_file, size, answer_chars=answer_chars)
+    sqlite_store = SQLiteCardStore(db_file)
+    cards = make_cards(size, answer_chars=answer_chars)
+    while True:
+        chunk = list(itertools.islice(cards, 5000))
+        if not chunk:
+            break
+        sqlite_store.add_many(chunk)
+    sqlite_store.close()
+    return json_file, db_file
+
+
+def _build(directory, size, answer_chars, corpus_dir=None):
+    """在 directory 中准备JSON与SQLite两份相同的语料。指定 corpus_dir 时语料只生成一次，
+    之后每次复制一份（基准会修改数据），大规模语料不必每轮重新生成"""
+    if corpus_dir is None:
+        json_file, db_file = _generate(directory, size, answer_chars)
+        return json_file, db_file, card_ids(size)
+    cached = os.path.join(corpus_dir, f"{size}_{answer_chars}")
+    if not os.path.exists(os.path.join(cached, "cards.sqlite3")):
+        os.makedirs(cached, exist_ok=True)
+        _generate(cached, size, answer_chars)
+    for name in ("cards.json", "cards.sqlite3"):
+        shutil.copy(os.path.join(cached, name), os.path.join(directory, name))
+    return os.path.join(directory, "cards.json"), os.path.join(directory, "cards.sqlite3"), card_ids(size)
+
+
+def bench_store(open_store, ids, search):
+    rng = random.Random(1)
+    deletable = rng.sample(ids, min(REPEAT, len(ids)))
+    result = {}
+    # 冷启动与建索引每轮都打开一个新的store，单次计时波动大，取中位数；之后的场景使用最后一轮的store
+    open_samples, build_samples = [], []
+    store = None
+    for _ in range(ROUNDS):
+        if store is not None and hasattr(store, "close"):
+            store.close()
+        started = time.perf_counter()
+        store = open_store()
+        store.page(CATEGORIES[2], 0, PAGE_SIZE)
+        open_samples.append((time.perf_counter() - started) * 1000)
+        searcher, build_ms = search(store)
+        build_samples.append(build_ms)
+    result["cold_open_ms"] = statistics.median(open_samples)
+
+    def category_page():
+        store.refresh()
+        store.count(CATEGORIES[2])
+        store.page(CATEGORIES[2], 0, PAGE_SIZE)
+
+    def starred_page():
+        store.refresh()
+        store.count(STARRED_VIEW)
+        store.page(STARRED_VIEW, 0, PAGE_SIZE)
+
+    result["category_page_ms"] = _timed(category_page, REPEAT)
+    result["starred_page_ms"] = _timed(starred_page, REPEAT)
+    if build_ms is not None:
+        result["search_index_build_ms"] = statistics.median(build_samples)
+    result["search_ms"] = _timed(lambda: searcher.search(QUERY, category=CATEGORIES[2], limit=SEARCH_LIMIT), REPEAT)
+    result["search_all_ms"] = _timed(lambda: searcher.search(QUERY, limit=SEARCH_LIMIT), REPEAT)
+    result["search_short_ms"] = _timed(
+        lambda: searcher.search(SHORT_QUERY, category=CATEGORIES[2], limit=SEARCH_LIMIT), REPEAT)
+    result["star_toggle_ms"] = _timed(lambda: store.set_starred(rng.choice(ids), True), REPEAT)
+    # 写入之后的第一次分类页需要重建视图，每轮先写入一次再单独计时
+    result["category_page_after_write_ms"] = _median_after(lambda: store.set_starred(rng.choice(ids), True),
+                                                           category_page)
+    result["append_ms"] = _timed(lambda: store.add("基准问题", "基准回答", CATEGORIES[0]), REPEAT)
+    # 写入之后的第一次检索需要先应用积压的索引更新，每轮先写入一次再单独计时
+    result["search_after_write_ms"] = _median_after(
+        lambda: store.add("基准问题", "基准回答", CATEGORIES[0]),
+        lambda: searcher.search(QUERY, category=CATEGORIES[2], limit=SEARCH_LIMIT))
+    saver = QASaver(store=store)
+    result["save_qa_ms"] = _timed(lambda: saver.save_qa("基准问题", "基准回答", CATEGORIES[0]), REPEAT)
+    result["delete_ms"] = _timed(lambda: store.delete(deletable.pop()), len(deletable))
+    return result
+
+
+def _json_search(store):
+    started = time.perf_counter()
+    index = SearchIndex(store)
+    return index, (time.perf_counter() - started) * 1000
+
+
+def run(sizes, answer_chars, corpus_dir=None):
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            json_file, db_file, ids = _build(directory, size, answer_chars, corpus_dir)
+            pack_file = os.path.join(directory, "cards.pack")
+            pack(json_file, pack_file)
+            row = {
+                "size": size,
+                "answer_chars": answer_chars,
+                "json_bytes": os.path.getsize(json_file),
+                "sqlite_bytes": os.path.getsize(db_file),
+                "packed_bytes": os.path.getsize(pack_file),
+                "json": bench_store(lambda: CardStore(json_file, compact_every=0), ids, _json_search),
+                "sqlite": bench_store(lambda: SQLiteCardStore(db_file), ids, lambda store: (store, None)),
+                "packed": bench_store(lambda: PackedCardStore(pack_file, compact_every=0), ids, _json_search),
+            }
+            results.append(row)
+            print(json.dumps(row, ensure_ascii=False), flush=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JSON与SQLite存储后端对比基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--answer-chars", type=int, default=500, help="每张卡片回答的字符数")
+    parser.add_argument("--corpus-dir", help="缓存生成的语料，重复运行时直接复用")
+    parser.add_argument("--output", help="把结果写入JSON文件")
+    args = parser.parse_args()
+    results = run(args.sizes, args.answer_chars, args.corpus_dir)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,51 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# 冷启动基准：在全新的Python进程中计时 ai_backend 的导入与首次使用，
+# 对应容器冷启动和Streamlit worker启动时的开销
+# 用法: python benchmarks/bench_import.py --repeat 10 --output result.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "python_startup": "pass",
+    "import_ai_backend": "import ai_backend",
+    "first_aiclient": "import ai_backend; ai_backend.aiclient",
+    "first_qasaver_save_path": "import ai_backend; ai_backend.qasaver.store",
+}
+
+
+def _run(code, env):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - started) * 1000
+
+
+def run(repeat):
+    env = dict(os.environ)
+    env.pop("ARK_API_KEY", None)  # 不发起真实请求，只衡量启动开销
+    results = {}
+    for name, code in SCENARIOS.items():
+        _run(code, env)  # 预热文件系统缓存
+        samples = [_run(code, env) for _ in range(repeat)]
+        results[name] = {"median_ms": round(statistics.median(samples), 2),
+                         "min_ms": round(min(samples), 2)}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ai_backend 冷启动基准")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output", help="把结果写入JSON文件")
+    args = parser.parse_args()
+    results = run(args.repeat)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
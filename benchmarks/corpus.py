@@ -0,0 +1,72 @@
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+# 合成卡片语料：结构与 questions&answers.json 一致，内容由AI产品相关的中文词汇随机拼成，
+# 固定随机种子保证每次生成的语料相同，便于不同版本之间对比
+
+CATEGORIES = ["技术原理与基础概念", "产品设计与用户体验",
+              "产品落地与工程实践", "特定场景与行业应用",
+              "团队协作与职业发展"]
+
+# 分类占比参考现有数据（产品落地与工程实践占多数）
+CATEGORY_WEIGHTS = [16, 14, 62, 6, 2]
+
+TERMS = ["大模型", "RAG", "Agent", "Prompt", "幻觉", "召回", "评估体系", "用户需求", "产品定位",
+         "商业化", "数据安全", "推理成本", "微调", "知识库", "多模态", "A/B测试", "留存率",
+         "冷启动", "向量检索", "对齐", "算力", "延迟", "灰度发布", "合规", "用户体验", "迭代策略"]
+QUESTION_TEMPLATES = ["如何设计{a}的{b}方案？", "{a}和{b}有什么区别？", "谈一谈{a}在{b}场景下的落地",
+                      "如果{a}效果不达预期，你会如何优化{b}？", "怎么评估{a}对{b}的影响？"]
+SENTENCE_TEMPLATES = ["核心观点：{a}需要与{b}协同推进。", "首先要明确{a}的边界，再结合{b}做取舍。",
+                      "例如在{a}场景中，可以通过{b}提升整体效果。", "### {a}\n- 关注{b}带来的风险与收益。",
+                      "从产品视角看，{a}决定了{b}的上限。"]
+
+
+def _fill(rng, template):
+    a, b = rng.sample(TERMS, 2)
+    return template.format(a=a, b=b)
+
+
+def make_card(rng, index, answer_chars=3000, start=datetime(2025, 1, 1)):
+    question = _fill(rng, rng.choice(QUESTION_TEMPLATES))
+    parts = []
+    length = 0
+    while length < answer_chars:
+        sentence = _fill(rng, rng.choice(SENTENCE_TEMPLATES))
+        parts.append(sentence)
+        length += len(sentence) + 1
+    return {
+        "id": f"bench_{index}",
+        "category": rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0],
+        "question": f"{question}（{index}）",
+        "answer": "\n".join(parts),
+        "timestamp": (start + timedelta(minutes=index)).strftime("%Y-%m-%d %H:%M:%S"),
+        "starred": rng.random() < 0.05,
+    }
+
+
+def make_cards(n, seed=0, answer_chars=3000):
+    """生成 n 张卡片（生成器，避免大规模语料一次性占用内存）"""
+    rng = random.Random(seed)
+    for index in range(n):
+        yield make_card(rng, index, answer_chars)
+
+
+def card_ids(n):
+    """make_cards(n) 生成的卡片id，不必重新生成语料"""
+    return [f"bench_{index}" for index in range(n)]
+
+
+def write_json(path, n, seed=0, answer_chars=3000):
+    """把语料逐张写成与 questions&answers.json 相同的JSON数组，内存占用与 n 无关。
+    先写临时文件再替换，中途中断不会留下半个语料文件"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for index, card in enumerate(make_cards(n, seed, answer_chars)):
+            f.write(",\n" if index else "\n")
+            f.write(json.dumps(card, ensure_ascii=False))
+        f.write("\n]\n")
+    os.replace(tmp_path, path)
+    return path
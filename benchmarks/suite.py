@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bench_backends  # noqa: E402
+from ai_backend import AIClient, MockArk  # noqa: E402
+from batch import run_batch  # noqa: E402
+from corpus import CATEGORIES  # noqa: E402
+
+# 完整基准套件：存储/检索场景（bench_backends）+ MockArk 驱动的生成吞吐，输出一份JSON，
+# 并可与之前保存的结果对比，找出变慢的场景
+# 用法: python benchmarks/suite.py --sizes 1000 100000 --output result.json
+#       python benchmarks/suite.py --sizes 1000 --baseline result.json   # 回归对比，有变慢的场景时退出码为1
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _meta(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "started": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "args": vars(args),
+    }
+
+
+def _mock_client(latency, chunk_delay=0.0):
+    client = AIClient()
+    client.client = MockArk(latency=latency, chunk_delay=chunk_delay)
+    client.backoff_scale = 0.0
+    return client
+
+
+def bench_generation(questions, latency, concurrency_levels, chunk_delay):
+    """MockArk 注入固定延迟：批量生成的吞吐随并发数的变化，以及流式生成的首字耗时"""
+    items = [(f"基准问题{index}", CATEGORIES[index % len(CATEGORIES)]) for index in range(questions)]
+    batch = []
+    for concurrency in concurrency_levels:
+        stats = run_batch(_mock_client(latency), items, store=None, concurrency=concurrency)
+        batch.append({"concurrency": concurrency, "questions": questions, "failed": stats["failed"],
+                      "elapsed_s": stats["elapsed"], "throughput_qps": stats["throughput"]})
+        print(json.dumps(batch[-1], ensure_ascii=False), flush=True)
+
+    client = _mock_client(latency, chunk_delay)
+    ttft, total = [], []
+    for question, category in items[:20]:
+        started = time.perf_counter()
+        for index, _ in enumerate(client.generate_answer_stream(question, category)):
+            if index == 0:
+                ttft.append((time.perf_counter() - started) * 1000)
+        total.append((time.perf_counter() - started) * 1000)
+    stream = {"ttft_ms": statistics.median(ttft), "total_ms": statistics.median(total)}
+    return {"mock_latency_s": latency, "chunk_delay_s": chunk_delay, "batch": batch, "stream": stream}
+
+
+def _flatten(results):
+    """{场景路径: 数值}，路径如 storage/100000/json/search_ms、generation/batch/c4/throughput_qps"""
+    flat = {}
+    for row in results.get("storage", []):
+        for backend in ("json", "sqlite", "packed"):
+            for key, value in row.get(backend, {}).items():
+                flat[f"storage/{row['size']}/{backend}/{key}"] = value
+    generation = results.get("generation")
+    if generation:
+        for row in generation["batch"]:
+            flat[f"generation/batch/c{row['concurrency']}/throughput_qps"] = row["throughput_qps"]
+        for key, value in generation["stream"].items():
+            flat[f"generation/stream/{key}"] = value
+    return flat
+
+
+def compare(results, baseline, tolerance, min_delta_ms=1.0):
+    """返回变慢超过 tolerance 的场景 [(路径, 基线, 本次, 变化比例)]。
+    *_ms 越小越好，*_qps 越大越好；只比较两次都有的场景。
+    亚毫秒级的操作抖动比例很大，绝对差值不足 min_delta_ms 的 *_ms 场景不算回归"""
+    current, previous = _flatten(results), _flatten(baseline)
+    regressions = []
+    for path in sorted(current.keys() & previous.keys()):
+        old, new = previous[path], current[path]
+        if not old or not new:
+            continue
+        if path.endswith("_ms") and new - old < min_delta_ms:
+            continue
+        change = old / new - 1 if path.endswith("_qps") else new / old - 1
+        if change > tolerance:
+            regressions.append((path, old, new, change))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="存储、检索与生成路径的基准套件")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="语料规模（卡片数），最大可到1000000")
+    parser.add_argument("--answer-chars", type=int, default=500, help="每张卡片回答的字符数")
+    parser.add_argument("--corpus-dir", help="缓存生成的语料，重复运行时直接复用")
+    parser.add_argument("--questions", type=int, default=200, help="生成吞吐测试的问题数")
+    parser.add_argument("--mock-latency", type=float, default=0.05, help="MockArk每次请求的注入延迟（秒）")
+    parser.add_argument("--chunk-delay", type=float, default=0.002, help="MockArk流式分片之间的延迟（秒）")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--skip-storage", action="store_true")
+    parser.add_argument("--skip-generation", action="store_true")
+    parser.add_argument("--output", help="把结果写入JSON文件")
+    parser.add_argument("--baseline", help="与之前保存的结果JSON对比")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的变慢比例，默认20%%")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="耗时差值低于此值时不算回归")
+    args = parser.parse_args()
+
+    results = {"meta": _meta(args)}
+    if not args.skip_storage:
+        results["storage"] = bench_backends.run(args.sizes, args.answer_chars, args.corpus_dir)
+    if not args.skip_generation:
+        results["generation"] = bench_generation(args.questions, args.mock_latency,
+                                                 args.concurrency, args.chunk_delay)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        for path, old, new, change in regressions:
+            print(f"变慢 {change:+.0%}: {path}  {old:.3f} -> {new:.3f}")
+        print(f"共 {len(regressions)} 个场景超出容差 {args.tolerance:.0%}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,76 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from prompts import DETAILED, AnswerTruncated
+
+# 后台问答任务：提交后立即返回任务id，由线程池调用AI客户端，
+# 页面按id轮询进度与结果，Streamlit脚本线程不再阻塞在LLM请求上
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+TRUNCATED = "truncated"  # 回答达到输出上限被截断：展示已生成的内容，但不能保存为卡片
+FAILED = "failed"
+
+
+class Job:
+    def __init__(self, question, category, mode=DETAILED):
+        self.id = uuid.uuid4().hex
+        self.question = question
+        self.category = category
+        self.mode = mode
+        self.status = QUEUED
+        self.partial = ""   # 流式生成过程中已收到的内容
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    @property
+    def pending(self):
+        return self.status in (QUEUED, RUNNING)
+
+
+class JobQueue:
+    def __init__(self, client, max_workers=4, max_jobs=500):
+        """client 需提供 generate_answer_stream(question, category, mode=...)；
+        超过 max_jobs 个任务时丢弃最早完成的任务"""
+        self.client = client
+        self.max_jobs = max_jobs
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-job")
+
+    def submit(self, question, category, mode=DETAILED):
+        job = Job(question, category, mode)
+        with self._lock:
+            self.jobs[job.id] = job
+            self._prune()
+        self._pool.submit(self._run, job)
+        return job.id
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def _run(self, job):
+        job.status = RUNNING
+        try:
+            for delta in self.client.generate_answer_stream(job.question, job.category, mode=job.mode):
+                job.partial += delta
+            job.result = job.partial
+            job.status = DONE
+        except AnswerTruncated as e:
+            job.error = str(e)
+            job.status = TRUNCATED
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        job.finished = time.time()
+
+    def _prune(self):
+        finished = [job for job in self.jobs.values() if not job.pending]
+        overflow = len(self.jobs) - self.max_jobs
+        for job in sorted(finished, key=lambda j: j.finished)[:max(0, overflow)]:
+            del self.jobs[job.id]
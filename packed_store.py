@@ -0,0 +1,192 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+
+from storage import DATA_FILE, CardStore, normalize_card
+
+try:
+    import zstandard
+except ImportError:  # zstandard 是可选依赖，没有时用标准库zlib
+    zstandard = None
+
+# 压缩打包的快照格式，与JSON快照一样配合追加写操作日志使用（PackedCardStore 只替换快照的读写）。
+# 文件布局：
+#   头部    magic(8) | 压缩算法(1) | 保留(3) | 元数据偏移(8) | 元数据长度(8)
+#   回答区  每条回答单独压缩，首尾相接
+#   元数据  zlib压缩的JSON数组，每项 [id, category, question, timestamp, starred, version, 偏移, 长度]
+# 打开时只解析元数据，回答区通过mmap按偏移读取；列表、筛选、分页都不会解压回答
+
+PACK_FILE = "questions&answers.pack"
+
+MAGIC = b"QAPACK01"
+HEADER = struct.Struct("<8sB3xQQ")
+
+CODEC_ZLIB = 0
+CODEC_ZSTD = 1
+
+
+def _compressor(codec):
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=10).compress
+    return lambda data: zlib.compress(data, 9)
+
+
+def _decompressor(codec):
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("该打包文件使用zstd压缩，需要安装 zstandard")
+        return zstandard.ZstdDecompressor().decompress
+    return zlib.decompress
+
+
+def write_pack(path, cards, answer_of, codec=None):
+    """把卡片写成打包文件，answer_of(card) 返回卡片的回答正文。
+    返回 (写入字节数, {card_id: (偏移, 长度)})"""
+    if codec is None:
+        codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+    compress = _compressor(codec)
+    rows = []
+    blobs = {}
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, codec, 0, 0))
+        offset = HEADER.size
+        for card in cards:
+            answer = answer_of(card)
+            blob = compress(answer.encode("utf-8")) if answer else b""
+            f.write(blob)
+            blobs[card["id"]] = (offset, len(blob))
+            rows.append([card["id"], card["category"], card["question"], card["timestamp"],
+                         int(card["starred"]), card["version"], offset, len(blob)])
+            offset += len(blob)
+        meta = zlib.compress(json.dumps(rows, ensure_ascii=False).encode("utf-8"), 6)
+        f.write(meta)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, codec, offset, len(meta)))
+        f.flush()
+        os.fsync(f.fileno())
+        return offset + len(meta), blobs
+
+
+class PackReader:
+    def __init__(self, path):
+        """以mmap打开打包文件，解析头部与元数据"""
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, codec, meta_offset, meta_length = HEADER.unpack_from(self._mmap, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} 不是卡片打包文件")
+            self._decompress = _decompressor(codec)
+            self.codec = codec
+            self.rows = json.loads(zlib.decompress(self._mmap[meta_offset:meta_offset + meta_length]))
+        except Exception:
+            self.close()
+            raise
+
+    def cards(self):
+        """元数据卡片（不含 answer 字段）与回答位置 {card_id: (偏移, 长度)}"""
+        cards, blobs = [], {}
+        for card_id, category, question, timestamp, starred, version, offset, length in self.rows:
+            cards.append({"id": card_id, "category": category, "question": question,
+                          "timestamp": timestamp, "starred": bool(starred), "version": version})
+            blobs[card_id] = (offset, length)
+        return cards, blobs
+
+    def read(self, offset, length):
+        if not length:
+            return ""
+        return self._decompress(self._mmap[offset:offset + length]).decode("utf-8")
+
+    def close(self):
+        if getattr(self, "_mmap", None) is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+
+class PackedCardStore(CardStore):
+    def __init__(self, data_file=PACK_FILE, compact_every=500):
+        """接口与 CardStore 相同。常驻内存的只有元数据；
+        日志中新增、尚未压缩进打包文件的卡片仍带 answer 字段"""
+        self._reader = None
+        self._blobs = {}  # card_id -> 回答在打包文件中的 (偏移, 长度)
+        super().__init__(data_file, compact_every)
+
+    def _snapshot_cards(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        self._blobs = {}
+        if not os.path.exists(self.data_file):
+            return []
+        self._reader = PackReader(self.data_file)
+        cards, self._blobs = self._reader.cards()
+        return cards
+
+    def answer(self, card_id):
+        with self._lock:
+            card = self.cards.get(card_id)
+            if card is None:
+                return None
+            if "answer" in card:
+                return card["answer"]
+            return self._reader.read(*self._blobs[card_id])
+
+    def _write_snapshot(self, path):
+        written, self._new_blobs = write_pack(path, list(self.cards.values()),
+                                              lambda card: self.answer(card["id"]))
+        return written
+
+    def _replace_snapshot(self, tmp_file):
+        # 先关闭旧文件的映射再替换（Windows不允许替换仍被映射的文件），之后回答都从新文件读取
+        if self._reader is not None:
+            self._reader.close()
+        os.replace(tmp_file, self.data_file)
+        self._reader = PackReader(self.data_file)
+        self._blobs = self._new_blobs
+        for card in self.cards.values():
+            card.pop("answer", None)
+
+    def export_json(self, path):
+        """导出为与 questions&answers.json 相同格式的JSON数组（含回答正文），返回卡片数"""
+        with self._lock:
+            cards = [dict(card, answer=self.answer(card["id"])) for card in self.cards.values()]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump([normalize_card(card) for card in cards], f, ensure_ascii=False, indent=2)
+        return len(cards)
+
+
+def pack(json_file=DATA_FILE, pack_file=PACK_FILE):
+    """把JSON快照+操作日志中的全部卡片导入打包文件（按id覆盖已有卡片），返回卡片数"""
+    source = CardStore(json_file)
+    store = PackedCardStore(pack_file)
+    with store._lock, store._file_lock:
+        store.refresh()
+        for card in source.all_cards():
+            store.cards[card["id"]] = dict(card)
+        store._bump()
+        store._notify("reset", None, None)
+        store.compact()
+    return len(store.cards)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # 用法: python packed_store.py pack [JSON文件] [打包文件]     JSON -> 打包格式
+    #       python packed_store.py unpack [打包文件] [JSON文件]   打包格式 -> JSON（无损往返）
+    command = sys.argv[1] if len(sys.argv) >= 2 else None
+    if command == "pack":
+        json_file = sys.argv[2] if len(sys.argv) >= 3 else DATA_FILE
+        pack_file = sys.argv[3] if len(sys.argv) >= 4 else PACK_FILE
+        count = pack(json_file, pack_file)
+        print(f"已打包 {count} 张卡片：{os.path.getsize(json_file)} -> {os.path.getsize(pack_file)} 字节")
+    elif command == "unpack":
+        pack_file = sys.argv[2] if len(sys.argv) >= 3 else PACK_FILE
+        json_file = sys.argv[3] if len(sys.argv) >= 4 else DATA_FILE
+        print(f"已导出 {PackedCardStore(pack_file).export_json(json_file)} 张卡片到 {json_file}")
+    else:
+        print("用法: python packed_store.py pack [json_file] [pack_file] | unpack [pack_file] [json_file]")
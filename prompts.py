@@ -0,0 +1,144 @@
+import math
+import re
+import threading
+
+from metrics import metrics
+
+# 提示词组装与token预算：回答指南作为固定不变的system消息（服务端可对相同前缀做缓存），
+# 用户消息只包含类别与问题；输出上限按回答模式（简要/详细）设置，都不超过旧版本的3000，
+# 并在本地估算每次请求的token数，统计与旧做法（指南拼进用户消息 + 固定3000上限）的差别，
+# 同时记录服务端报告的输出token数（usage.completion_tokens），调整上限以它为依据；
+# 回答达到输出上限被截断（finish_reason == "length"）时计数，截断的回答不缓存也不保存
+
+# 定义AI产品经理面试回答指南作为基础prompt（保持不变）
+AI_PRODUCT_MANAGER_PROMPT = """你是一名非常资深的AI产品经理。我是一个正在进行AI产品求职的人。我会向你请教一系列AI产品经理面试问题，希望你能结合 AI 产品的特性、行业实践和自身对岗位的理解，给出逻辑清晰、内容详实且有深度的回答。
+回答时请遵循以下原则：
+只需要进行问题的回答，无需寒暄客套。
+字数限制在2000字以内;
+针对性：紧密围绕问题核心，不偏离主题；
+专业性：体现对 AI 技术（如大模型能力边界、数据安全、算法逻辑等）的扎实认知，不出现技术认知错误；
+产品思维：必须有产品经理必备的思维（如用户需求分析、产品定位、迭代策略等）；
+商业思维：如果涉及实际业务应用，需要考虑落地性、商业化等问题，体现出商业思维。
+表达：语言简洁，用词专业，结构化，采用 "观点 + 分析 " 的模式，先用核心观点回应，再分点展开分析。
+案例：如果只讨论理论不足以解释问题，必要时可结合过往经验或行业案例佐证（可合理虚构符合逻辑的经历）；
+前瞻性：在回答中体现对 AI 产品发展趋势的思考，如AI产品体验与比较、技术与场景的结合、用户体验的优化方向、伦理合规等潜在问题的应对思路；
+"""
+
+LEGACY_MAX_TOKENS = 3000  # 旧版本所有请求统一使用的输出上限
+
+DETAILED = "detailed"
+BRIEF = "brief"
+MODES = {DETAILED: "详细", BRIEF: "简要"}
+
+GUIDE_MAX_CHARS = 2000     # 指南允许的字数，中文约每字1个token
+REASONING_HEADROOM = 1000  # 深度思考模型的推理token同样占用输出上限，额外预留
+
+# 输出上限：指南允许的字数加推理余量，且不超过旧版本的上限（现有卡片都是在3000的上限下生成的）
+DETAILED_MAX_TOKENS = min(GUIDE_MAX_CHARS + REASONING_HEADROOM, LEGACY_MAX_TOKENS)
+BRIEF_MAX_TOKENS = 800 + REASONING_HEADROOM  # 简要模式要求500字以内
+MODE_MAX_TOKENS = {DETAILED: DETAILED_MAX_TOKENS, BRIEF: BRIEF_MAX_TOKENS}
+
+# 追加在用户消息末尾的模式说明；详细模式沿用指南本身的要求，不追加
+MODE_INSTRUCTIONS = {
+    DETAILED: "",
+    BRIEF: "\n请简要回答：500字以内，只给核心观点和不超过3个要点。",
+}
+
+
+class AnswerTruncated(RuntimeError):
+    """回答达到输出上限被截断（finish_reason == "length"），不应缓存或保存为卡片"""
+
+
+_CJK_RE = re.compile(r"[　-〿㐀-䶿一-鿿＀-￯]")
+
+
+def estimate_tokens(text):
+    """本地估算token数：中文及全角字符按每字1个token，其余字符按每4个1个token。
+    只用于预算与统计，不追求与服务端分词完全一致"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def max_tokens_for(mode=DETAILED):
+    return MODE_MAX_TOKENS[mode]
+
+
+def cache_prompt(mode=DETAILED):
+    """参与回答缓存键的提示词：详细模式与旧版本相同，已有缓存继续命中；简要模式单独缓存"""
+    return AI_PRODUCT_MANAGER_PROMPT + MODE_INSTRUCTIONS[mode]
+
+
+def build_messages(question, category, mode=DETAILED):
+    """返回 (messages, max_tokens)：指南作为system消息，类别、问题与模式说明作为user消息"""
+    if mode not in MODES:
+        raise ValueError(f"未知的回答模式: {mode}")
+    messages = [
+        {"role": "system", "content": AI_PRODUCT_MANAGER_PROMPT},
+        {"role": "user", "content": f"类别: {category}\n问题: {question}{MODE_INSTRUCTIONS[mode]}"},
+    ]
+    return messages, max_tokens_for(mode)
+
+
+class PromptStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._system_tokens = estimate_tokens(AI_PRODUCT_MANAGER_PROMPT)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.by_mode = {mode: 0 for mode in MODES}
+            self.prompt_tokens = 0        # 本地估算的输入token
+            self.prefix_tokens = 0        # 其中可被服务端前缀缓存复用的system部分
+            self.max_tokens = 0           # 实际设置的输出上限之和
+            self.legacy_max_tokens = 0    # 旧做法的输出上限之和
+            self.cached_tokens = 0        # 服务端报告的前缀缓存命中token
+            self.completion_tokens = {mode: 0 for mode in MODES}      # 服务端报告的输出token之和
+            self.max_completion_tokens = {mode: 0 for mode in MODES}  # 单次回答的最大输出token
+            self.truncated = {mode: 0 for mode in MODES}  # 达到输出上限被截断的回答
+
+    def record(self, messages, max_tokens, mode):
+        prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+        with self._lock:
+            self.requests += 1
+            self.by_mode[mode] += 1
+            self.prompt_tokens += prompt_tokens
+            self.prefix_tokens += self._system_tokens
+            self.max_tokens += max_tokens
+            self.legacy_max_tokens += LEGACY_MAX_TOKENS
+        metrics.inc("llm_prompt_tokens_estimated_total", prompt_tokens, mode=mode)
+        metrics.inc("llm_max_tokens_budget_total", max_tokens, mode=mode)
+
+    def record_cached(self, tokens):
+        with self._lock:
+            self.cached_tokens += tokens
+
+    def record_completion(self, tokens, mode):
+        with self._lock:
+            self.completion_tokens[mode] += tokens
+            self.max_completion_tokens[mode] = max(self.max_completion_tokens[mode], tokens)
+
+    def record_truncated(self, mode):
+        with self._lock:
+            self.truncated[mode] += 1
+        metrics.inc("llm_truncated_total", mode=mode)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "by_mode": dict(self.by_mode),
+                "prompt_tokens_estimated": self.prompt_tokens,
+                "cacheable_prefix_tokens": self.prefix_tokens,
+                "server_cached_tokens": self.cached_tokens,
+                "max_tokens_budget": self.max_tokens,
+                "legacy_max_tokens_budget": self.legacy_max_tokens,
+                "completion_tokens": dict(self.completion_tokens),
+                "max_completion_tokens": dict(self.max_completion_tokens),
+                "truncated": dict(self.truncated),
+            }
+
+
+# 进程级统计，AIClient 每次发起请求时记录
+prompt_stats = PromptStats()
@@ -0,0 +1,360 @@
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+
+from metrics import metrics
+from storage import CATEGORIES, STARRED_VIEW, FileLock
+
+# 收藏卡片的间隔复习（SM-2 的简化变体）。
+# 每张收藏卡片的复习状态（熟练度系数 ease、间隔天数、到期时间等）记录在卡片库旁的追加写复习日志中：
+# 每次评分只追加一行，记录写的是评分后的绝对状态，重放时同一张卡片以最后一行为准（幂等）；
+# 日志累积到一定行数后压缩为每张卡片一行。
+# 内存中用按到期时间排序的小顶堆维护待复习队列：取下一张到期卡片为 O(log n)，
+# 取消收藏、删除、重新评分后留在堆里的旧条目在出堆时才丢弃（惰性删除）。
+# store的变更回调只登记卡片id，访问队列前再读取卡片的当前状态更新队列（与 search.SearchIndex 相同）
+
+logger = logging.getLogger(__name__)
+
+AGAIN, HARD, GOOD, EASY = 0, 1, 2, 3
+GRADES = {AGAIN: "忘记", HARD: "困难", GOOD: "良好", EASY: "简单"}
+
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+RELEARN_SECONDS = 10 * 60  # 忘记的卡片10分钟后再复习
+DAY_SECONDS = 24 * 3600
+
+
+def new_state(card_id):
+    """从未复习过的收藏卡片：到期时间为0，排在所有已复习卡片之前"""
+    return {"id": card_id, "ease": INITIAL_EASE, "interval": 0.0, "due": 0.0,
+            "reps": 0, "lapses": 0, "last_review": None}
+
+
+def schedule(state, grade, now):
+    """按评分计算新的复习状态（不修改传入的state）。interval 单位为天"""
+    if grade not in GRADES:
+        raise ValueError(f"未知的评分: {grade}")
+    state = dict(state, last_review=now)
+    if grade == AGAIN:
+        state["ease"] = max(MIN_EASE, state["ease"] - 0.2)
+        state["reps"] = 0
+        state["lapses"] += 1
+        state["interval"] = 0.0
+        state["due"] = now + RELEARN_SECONDS
+        return state
+    if grade == HARD:
+        state["ease"] = max(MIN_EASE, state["ease"] - 0.15)
+        interval = max(1.0, state["interval"] * 1.2)
+    elif state["reps"] == 0:
+        interval = 1.0
+    elif state["reps"] == 1:
+        interval = 3.0
+    else:
+        interval = state["interval"] * state["ease"]
+    if grade == EASY:
+        state["ease"] += 0.15
+        interval *= 1.3
+    state["reps"] += 1
+    state["interval"] = round(interval, 2)
+    state["due"] = now + state["interval"] * DAY_SECONDS
+    return state
+
+
+def default_review_file(store):
+    """复习日志与卡片库放在一起：<卡片库文件>.reviews"""
+    return os.environ.get("CARD_REVIEW_FILE") or (getattr(store, "data_file", None) or store.db_file) + ".reviews"
+
+
+class ReviewScheduler:
+    def __init__(self, store, review_file=None, compact_every=1000):
+        """读取复习日志、按当前收藏的卡片建立到期队列，并随store的收藏/增删增量更新"""
+        self.store = store
+        self.review_file = review_file or default_review_file(store)
+        self.compact_every = compact_every
+        self.states = {}      # card_id -> 最新复习状态（含已取消收藏的卡片，重新收藏时沿用）
+        self.starred = set()  # 当前收藏的卡片id
+        self._heap = []       # (到期时间, card_id)，可能含过期条目
+        self._deleted = set() # 已删除的卡片id，压缩日志时丢弃其状态
+        self._lock = threading.RLock()
+        self._pending_lock = threading.Lock()
+        self._pending = set()  # 收藏状态可能变化、尚未应用的卡片id
+        self._stale = False    # 收到 reset，下次访问前按store重建队列
+        self._file_lock = FileLock(self.review_file + ".lock")
+        self._offset = 0      # 已读取到的日志字节位置
+        self._log_lines = 0
+        self._signature = None
+        self.load()
+        self.rebuild()
+        store.subscribe(self._on_change)
+
+    # ---------- 复习日志 ----------
+
+    def load(self):
+        with self._lock, self._file_lock:
+            self.states = {}
+            self._offset = 0
+            self._log_lines = 0
+            self._read_log()
+            self._reheap()
+
+    def _read_log(self):
+        """从上次读到的位置继续读取（其他进程追加的评分），末尾不完整的行留到下次再读。
+        返回新读入的状态"""
+        try:
+            st = os.stat(self.review_file)
+        except FileNotFoundError:
+            self._signature = None
+            return []
+        new_states = []
+        started = time.perf_counter()
+        with open(self.review_file, "rb") as f:
+            f.seek(self._offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                self._offset += len(raw)
+                try:
+                    state = json.loads(raw)
+                except ValueError:
+                    logger.warning("复习日志中存在无法解析的记录，已跳过")
+                    continue
+                self.states[state["id"]] = state
+                new_states.append(state)
+                self._log_lines += 1
+        self._signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+        metrics.observe("storage_io_seconds", time.perf_counter() - started, op="read_reviews")
+        return new_states
+
+    def refresh(self):
+        """复习日志被其他进程追加时读入新增的行，被压缩替换时整体重新加载。返回是否有变化"""
+        with self._lock:
+            try:
+                st = os.stat(self.review_file)
+                signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+            except FileNotFoundError:
+                signature = None
+            if signature == self._signature:
+                return False
+            if signature is None or self._signature is None or signature[0] != self._signature[0] \
+                    or signature[1] < self._offset:
+                self.load()
+                return True
+            with self._file_lock:
+                # 新读入的状态重新入堆，旧条目按惰性删除处理
+                for state in self._read_log():
+                    if state["id"] in self.starred:
+                        heapq.heappush(self._heap, (state["due"], state["id"]))
+            return True
+
+    def _append(self, state):
+        data = (json.dumps(state, ensure_ascii=False) + "\n").encode("utf-8")
+        with metrics.timer("storage_io_seconds", op="append_review"):
+            with open(self.review_file, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        metrics.inc("storage_bytes_written_total", len(data), op="append_review")
+        self._offset += len(data)
+        self._log_lines += 1
+        st = os.stat(self.review_file)
+        self._signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def compact(self):
+        """把复习日志重写为仍存在的卡片每张一行（临时文件 + os.replace 原子替换）"""
+        self._sync()
+        with self._lock, self._file_lock:
+            self._read_log()
+            states = [state for card_id, state in self.states.items() if card_id not in self._deleted]
+            tmp_file = self.review_file + ".tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                for state in states:
+                    f.write(json.dumps(state, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.review_file)
+            self.states = {state["id"]: state for state in states}
+            self._deleted = set()
+            self._offset = os.path.getsize(self.review_file)
+            self._log_lines = len(states)
+            st = os.stat(self.review_file)
+            self._signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    # ---------- 到期队列 ----------
+
+    # store的回调在持有store锁时进入本对象，只使用 _pending_lock 登记变更；
+    # 读取store（rebuild、_sync）可以在持有本对象的锁时进行，不会与回调形成锁顺序反转
+
+    def rebuild(self):
+        """按store中当前收藏的卡片重建队列"""
+        starred = {card["id"] for card in self.store.view(STARRED_VIEW)}
+        with self._lock:
+            self.starred = starred
+            self._reheap()
+
+    def _reheap(self):
+        self._heap = [(self.state(card_id)["due"], card_id) for card_id in self.starred]
+        heapq.heapify(self._heap)
+
+    def _on_change(self, op, card_id, card):
+        with self._pending_lock:
+            if op == "reset":
+                self._stale = True
+                self._pending = set()
+            else:
+                self._pending.add(card_id)
+
+    def _sync(self):
+        """应用积压的变更：按卡片的当前状态加入或移出收藏队列，收到过 reset 时整体重建"""
+        with self._pending_lock:
+            stale, pending = self._stale, self._pending
+            self._stale, self._pending = False, set()
+        if stale:
+            self.rebuild()
+            return
+        if not pending:
+            return
+        cards = {card_id: self.store.get(card_id) for card_id in pending}
+        with self._lock:
+            for card_id, card in cards.items():
+                if card is None:
+                    self.starred.discard(card_id)
+                    self._deleted.add(card_id)
+                    continue
+                self._deleted.discard(card_id)
+                if card["starred"] and card["category"] in CATEGORIES:
+                    if card_id not in self.starred:
+                        self.starred.add(card_id)
+                        self._push(card_id)
+                else:
+                    self.starred.discard(card_id)
+
+    def _push(self, card_id):
+        heapq.heappush(self._heap, (self.state(card_id)["due"], card_id))
+        # 反复收藏/取消收藏会积累过期条目，超过有效条目的两倍时重建
+        if len(self._heap) > 2 * len(self.starred) + 64:
+            self._reheap()
+
+    def _valid(self, entry):
+        due, card_id = entry
+        state = self.states.get(card_id)
+        return card_id in self.starred and (state["due"] if state else 0.0) == due
+
+    def state(self, card_id):
+        """卡片的当前复习状态，从未复习过时为初始状态"""
+        return self.states.get(card_id) or new_state(card_id)
+
+    def next_due(self, now=None):
+        """下一张到期的收藏卡片id，没有到期卡片时返回None"""
+        now = time.time() if now is None else now
+        self._sync()
+        with self._lock:
+            self.refresh()
+            while self._heap and not self._valid(self._heap[0]):
+                heapq.heappop(self._heap)
+            if self._heap and self._heap[0][0] <= now:
+                return self._heap[0][1]
+            return None
+
+    def next_review_at(self):
+        """最早的到期时间（可能已过去），没有收藏卡片时返回None"""
+        self._sync()
+        with self._lock:
+            self.refresh()
+            while self._heap and not self._valid(self._heap[0]):
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def _due_entries(self, now):
+        """沿堆的树结构只访问到期时间不晚于now的条目及其子节点，与收藏卡片总数无关"""
+        self._sync()
+        with self._lock:
+            self.refresh()
+            heap = self._heap
+            found = set()
+            stack = [0] if heap else []
+            while stack:
+                index = stack.pop()
+                entry = heap[index]
+                if entry[0] > now:
+                    continue
+                if self._valid(entry):
+                    found.add(entry)
+                if 2 * index + 2 < len(heap):
+                    stack.append(2 * index + 1)
+                    stack.append(2 * index + 2)
+                elif 2 * index + 1 < len(heap):
+                    stack.append(2 * index + 1)
+            return found
+
+    def due(self, now=None, limit=None):
+        """已到期的收藏卡片id，按到期时间排序"""
+        found = self._due_entries(time.time() if now is None else now)
+        found = sorted(found) if limit is None else heapq.nsmallest(limit, found)
+        return [card_id for _, card_id in found]
+
+    def due_count(self, now=None):
+        return len(self._due_entries(time.time() if now is None else now))
+
+    # ---------- 评分 ----------
+
+    def preview(self, card_id, now=None):
+        """各评分对应的下次间隔（天），用于在按钮上展示"""
+        now = time.time() if now is None else now
+        state = self.state(card_id)
+        return {grade: (schedule(state, grade, now)["due"] - now) / DAY_SECONDS for grade in GRADES}
+
+    def review(self, card_id, grade, now=None):
+        """记录一次评分：追加一行复习日志并把卡片按新的到期时间重新入堆，返回新状态"""
+        now = time.time() if now is None else now
+        self._sync()
+        with self._lock, self._file_lock:
+            self.refresh()
+            state = schedule(self.state(card_id), grade, now)
+            self._append(state)
+            self.states[card_id] = state
+            if card_id in self.starred:
+                heapq.heappush(self._heap, (state["due"], card_id))
+            metrics.inc("reviews_total", grade=GRADES[grade])
+            if self.compact_every and self._log_lines >= self.compact_every + len(self.states):
+                self.compact()
+        return state
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+
+    from storage import open_store
+
+    # 用法: python review.py              查看到期情况
+    #       python review.py --simulate 30  模拟30天的复习（随机评分），检查间隔的增长
+    parser = argparse.ArgumentParser(description="收藏卡片的间隔复习")
+    parser.add_argument("--simulate", type=int, help="在临时复习日志上模拟的天数")
+    args = parser.parse_args()
+
+    store = open_store()
+    if args.simulate:
+        import tempfile
+
+        scheduler = ReviewScheduler(store, os.path.join(tempfile.mkdtemp(), "reviews"))
+        now = time.time()
+        rng = random.Random(0)
+        for day in range(args.simulate):
+            reviewed = 0
+            while True:
+                card_id = scheduler.next_due(now)
+                if card_id is None:
+                    break
+                scheduler.review(card_id, rng.choices(list(GRADES), weights=[1, 2, 6, 2])[0], now)
+                reviewed += 1
+            print(f"第 {day + 1} 天：复习 {reviewed} 张")
+            now += DAY_SECONDS
+    else:
+        scheduler = ReviewScheduler(store)
+        print(f"收藏 {len(scheduler.starred)} 张，当前到期 {scheduler.due_count()} 张")
+        next_at = scheduler.next_review_at()
+        if next_at:
+            print(f"最早到期: {time.strftime('%Y-%m-%d %H:%M', time.localtime(next_at))}")
@@ -0,0 +1,423 @@
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import metrics
+
+# 多后端模型池：对外提供与openai客户端相同的 chat.completions.create 接口，可直接作为 AIClient.client。
+# - 每个后端有独立的并发上限
+# - 按优先级分档，同档内选近期延迟（p50 × 占用率）最低的后端；高优先级档全部不可用时才用下一档
+# - 非流式请求超过主后端近期p95仍未返回时，向另一个后端发出对冲请求，取先成功的结果；
+#   流式请求按首个数据块的延迟（TTFT）对冲：主后端超过其TTFT的p95仍没有产出首块时再发一路，
+#   保留先产出首块的流，另一路读到首块后关闭。已经开始输出后中途失败不再切换
+# - 每个后端带熔断器：连续失败达到阈值后打开，冷却后放行一个探测请求，成功则恢复
+# 配置方式见 load_pool，设置环境变量 MODEL_POOL_CONFIG 指向配置文件后 AIClient 自动使用模型池
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+LATENCY_WINDOW = 200  # 每个后端保留最近多少次成功请求的耗时（以及流式请求的首块延迟）
+MIN_SAMPLES = 20      # 样本不足时不计算分位数，也不触发对冲
+
+
+class NoBackendAvailable(RuntimeError):
+    """模型池中没有可用的后端（全部熔断或等待并发超时）"""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def available(self):
+        """是否可能放行请求（只读，不占用半开状态的探测名额）"""
+        return self.state != OPEN or time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True  # 半开状态只放行一个探测请求
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """记录一次失败，返回熔断器是否因此打开"""
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                opened = self.state != OPEN
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+                return opened
+            return False
+
+
+class Backend:
+    def __init__(self, name, client, model, max_concurrency=4, priority=0, breaker=None):
+        """client 为 openai.OpenAI 或 MockArk 这类提供 chat.completions.create 的客户端；
+        priority 越小越优先"""
+        self.name = name
+        self.client = client
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.priority = priority
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.ttfts = deque(maxlen=LATENCY_WINDOW)  # 流式请求从发起到首个数据块的耗时
+        self.inflight = 0
+        self.requests = 0
+        self.failures = 0
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+
+    @property
+    def is_mock(self):
+        return getattr(self.client, "is_mock", False)
+
+    def quantile(self, q, ttft=False):
+        """近期成功请求耗时的分位数；ttft 为True时取流式请求首块延迟的分位数"""
+        with self._lock:
+            samples = sorted(self.ttfts if ttft else self.latencies)
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def score(self):
+        """路由得分（越小越好）：近期p50延迟按并发占用率放大；还没有样本的后端得分为0，优先试探"""
+        p50 = self.quantile(0.5) or 0.0
+        return p50 * (1 + self.inflight / self.max_concurrency)
+
+    def acquire(self, timeout=None):
+        """占用一个并发名额；timeout 为0时不等待。熔断器拒绝时归还名额并返回False"""
+        if timeout == 0:
+            acquired = self._slots.acquire(blocking=False)
+        else:
+            acquired = self._slots.acquire(timeout=timeout)
+        if not acquired:
+            return False
+        if not self.breaker.allow():
+            self._slots.release()
+            return False
+        with self._lock:
+            self.inflight += 1
+        return True
+
+    def release(self, latency=None, error=None):
+        """归还并发名额并记录结果（latency 为成功请求的耗时，error 为失败时的异常）；
+        两者都为None表示流在读完前被调用方关闭，不计入延迟样本"""
+        with self._lock:
+            self.inflight -= 1
+            self.requests += 1
+            if error is not None:
+                self.failures += 1
+            elif latency is not None:
+                self.latencies.append(latency)
+        self._slots.release()
+        outcome = "error" if error is not None else "ok" if latency is not None else "cancelled"
+        metrics.inc("llm_backend_requests_total", backend=self.name, outcome=outcome)
+        if error is None:
+            self.breaker.record_success()
+            if latency is not None:
+                metrics.observe("llm_backend_seconds", latency, backend=self.name)
+        elif self.breaker.record_failure():
+            metrics.inc("llm_circuit_open_total", backend=self.name)
+
+    def record_ttft(self, seconds):
+        with self._lock:
+            self.ttfts.append(seconds)
+        metrics.observe("llm_backend_ttft_seconds", seconds, backend=self.name)
+
+    def status(self):
+        return {"name": self.name, "model": self.model, "priority": self.priority,
+                "state": self.breaker.state, "inflight": self.inflight,
+                "max_concurrency": self.max_concurrency, "requests": self.requests,
+                "failures": self.failures, "p50": self.quantile(0.5), "p95": self.quantile(0.95),
+                "ttft_p95": self.quantile(0.95, ttft=True)}
+
+
+class ModelPool:
+    def __init__(self, backends, hedge=True, hedge_after=None, hedge_quantile=0.95, acquire_timeout=60.0):
+        """hedge_after 为非流式请求固定的对冲等待时间（秒），为None时使用主后端近期的 hedge_quantile 分位延迟；
+        流式请求总是按主后端首块延迟的 hedge_quantile 分位对冲；
+        所有后端都满载时最多等待 acquire_timeout 秒"""
+        if not backends:
+            raise ValueError("模型池至少需要一个后端")
+        self.backends = list(backends)
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.hedge_quantile = hedge_quantile
+        self.acquire_timeout = acquire_timeout
+        self._served = threading.local()  # 各线程上一次 create 实际使用的后端
+        self._executor = ThreadPoolExecutor(max_workers=sum(b.max_concurrency for b in self.backends),
+                                            thread_name_prefix="model-pool")
+
+    @property
+    def chat(self):
+        return self
+
+    @property
+    def completions(self):
+        return self
+
+    @property
+    def is_mock(self):
+        return all(backend.is_mock for backend in self.backends)
+
+    def status(self):
+        return [backend.status() for backend in self.backends]
+
+    def served_backend(self):
+        """当前线程上一次 create 返回的结果来自哪个后端（对冲时为胜出的后端），失败时为 None"""
+        return getattr(self._served, "backend", None)
+
+    def _candidates(self, exclude=()):
+        """未被熔断的后端，按 (优先级, 路由得分) 排序"""
+        candidates = [b for b in self.backends if b not in exclude and b.breaker.available()]
+        return sorted(candidates, key=lambda b: (b.priority, b.score()))
+
+    def _acquire(self, exclude=(), block=True):
+        """选出并占用一个后端：依次尝试有空闲并发的候选，都满载时（block为True）等待最优的一个"""
+        candidates = self._candidates(exclude)
+        for backend in candidates:
+            if backend.acquire(timeout=0):
+                return backend
+        if block and candidates and candidates[0].acquire(timeout=self.acquire_timeout):
+            return candidates[0]
+        return None
+
+    def _call(self, backend, kwargs):
+        """在已占用的后端上发起请求；流式请求在迭代结束时才归还名额"""
+        started = time.perf_counter()
+        try:
+            response = backend.client.chat.completions.create(model=backend.model, **kwargs)
+        except Exception as e:
+            backend.release(error=e)
+            raise
+        if kwargs.get("stream"):
+            return self._stream(backend, response, started)
+        backend.release(latency=time.perf_counter() - started)
+        return response
+
+    def _stream(self, backend, stream, started):
+        error = None
+        finished = False
+        try:
+            for index, chunk in enumerate(stream):
+                if index == 0:
+                    backend.record_ttft(time.perf_counter() - started)
+                yield chunk
+            finished = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if finished or error is not None:
+                backend.release(latency=time.perf_counter() - started, error=error)
+            else:
+                # 调用方提前关闭（如对冲中落败的流）：同时关闭底层连接
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+                backend.release()
+
+    def _start_stream(self, backend, kwargs):
+        """发起流式请求并读出首个数据块，返回 (已读出的块, 剩余的流)；空的流返回空列表"""
+        stream = self._call(backend, kwargs)
+        return list(itertools.islice(stream, 1)), stream
+
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        """与 openai 的 chat.completions.create 相同；model 参数被忽略，使用各后端配置的模型"""
+        kwargs.update(messages=messages, stream=stream)
+        self._served.backend = None
+        if not self.hedge:
+            return self._create_failover(kwargs)
+        if stream:
+            return _resume(*self._create_hedged(kwargs, self._start_stream, ttft=True, discard=_close_stream))
+        return self._create_hedged(kwargs, self._call)
+
+    def _create_failover(self, kwargs):
+        """依次尝试可用的后端，失败立即换下一个（不做退避等待），全部失败时抛出最后一个异常"""
+        tried = []
+        last_error = None
+        while True:
+            backend = self._acquire(exclude=tried)
+            if backend is None:
+                break
+            tried.append(backend)
+            try:
+                response = self._call(backend, kwargs)
+            except Exception as e:
+                last_error = e
+                continue
+            self._served.backend = backend
+            return response
+        raise last_error or NoBackendAvailable("模型池中没有可用的后端")
+
+    def _hedge_delay(self, backend, ttft=False):
+        if self.hedge_after is not None and not ttft:
+            return self.hedge_after
+        return backend.quantile(self.hedge_quantile, ttft=ttft)
+
+    def _create_hedged(self, kwargs, start, ttft=False, discard=None):
+        """在后端上执行 start(backend, kwargs)，超过主后端的分位延迟（ttft为True时为首块延迟）仍未完成时
+        对冲到另一个后端，返回先成功的结果；discard 用于处理胜出后才完成的落败结果"""
+        primary = self._acquire()
+        if primary is None:
+            raise NoBackendAvailable("模型池中没有可用的后端")
+        tried = [primary]
+        futures = {self._executor.submit(start, primary, kwargs): primary}
+        delay = self._hedge_delay(primary, ttft)
+        last_error = None
+        while futures:
+            done, _ = wait(futures, timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                # 超过主后端的p95仍未返回：向另一个有空闲并发的后端发出对冲请求
+                delay = None
+                backend = self._acquire(exclude=tried, block=False)
+                if backend is not None:
+                    tried.append(backend)
+                    futures[self._executor.submit(start, backend, kwargs)] = backend
+                    metrics.inc("llm_hedges_total", backend=backend.name)
+                continue
+            for future in done:
+                backend = futures.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                # 落后的请求在后台继续执行完，结果丢弃（或交给discard），名额在其结束时归还
+                for loser in itertools.chain(done - {future}, futures):
+                    if discard is not None:
+                        loser.add_done_callback(discard)
+                if backend is not primary:
+                    metrics.inc("llm_hedge_wins_total", backend=backend.name)
+                self._served.backend = backend
+                return response
+            if futures:
+                # 已有请求失败但还有在途的慢请求：立即向下一个后端对冲，不再干等
+                delay = 0
+            else:
+                # 在途请求全部失败：换一个后端继续
+                backend = self._acquire(exclude=tried)
+                if backend is not None:
+                    tried.append(backend)
+                    futures[self._executor.submit(start, backend, kwargs)] = backend
+        raise last_error or NoBackendAvailable("模型池中没有可用的后端")
+
+
+def _resume(head, stream):
+    """把 _start_stream 读出的首块接回流的开头"""
+    yield from head
+    yield from stream
+
+
+def _close_stream(future):
+    """对冲中落败的流式请求：读出首块后立即关闭，归还并发名额"""
+    if future.exception() is None:
+        future.result()[1].close()
+
+
+def _make_client(spec):
+    if "mock" in spec:
+        from ai_backend import MockArk
+        return MockArk(**spec["mock"])
+    from openai import OpenAI
+    return OpenAI(base_url=spec["base_url"], api_key=os.environ.get(spec.get("api_key_env", "ARK_API_KEY")))
+
+
+def build_pool(config):
+    """按配置字典创建模型池：
+    {"hedge": true, "hedge_after": null,
+     "backends": [{"name": "primary", "model": "doubao-seed-1-6-250615",
+                   "base_url": "https://ark.cn-beijing.volces.com/api/v3", "api_key_env": "ARK_API_KEY",
+                   "max_concurrency": 8, "priority": 0, "failure_threshold": 5, "reset_timeout": 30},
+                  {"name": "local", "model": "mock", "mock": {"latency": 0.2, "failure_rate": 0.1}}]}
+    带 mock 字段的后端使用 MockArk（参数原样传入），便于本地模拟不同的延迟与错误特征"""
+    backends = []
+    for spec in config["backends"]:
+        breaker = CircuitBreaker(spec.get("failure_threshold", 5), spec.get("reset_timeout", 30.0))
+        backends.append(Backend(spec["name"], _make_client(spec), spec.get("model", spec["name"]),
+                                max_concurrency=spec.get("max_concurrency", 4),
+                                priority=spec.get("priority", 0), breaker=breaker))
+    return ModelPool(backends, hedge=config.get("hedge", True), hedge_after=config.get("hedge_after"),
+                     hedge_quantile=config.get("hedge_quantile", 0.95),
+                     acquire_timeout=config.get("acquire_timeout", 60.0))
+
+
+def load_pool(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return build_pool(json.load(f))
+
+
+if __name__ == "__main__":
+    import argparse
+    import statistics
+
+    # 用法: python routing.py --requests 300 --concurrency 8 [--stream]
+    # 用三个不同特征的MockArk模拟：有长尾的主模型、经常限流的快模型、稳定但慢的备用模型，
+    # 对比开启/关闭对冲时的延迟分布与失败数；--stream 时统计的是流式请求的首块延迟
+    parser = argparse.ArgumentParser(description="模型池路由/对冲/熔断的本地模拟")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stream", action="store_true", help="模拟流式请求，统计首块延迟")
+    args = parser.parse_args()
+
+    config = {"backends": [
+        {"name": "primary", "mock": {"latency": 0.05, "slow_rate": 0.02, "slow_latency": 1.0}, "max_concurrency": 6},
+        {"name": "flaky", "mock": {"latency": 0.03, "failure_rate": 0.5}, "max_concurrency": 6,
+         "failure_threshold": 3, "reset_timeout": 1.0},
+        {"name": "fallback", "mock": {"latency": 0.2}, "max_concurrency": 4, "priority": 1},
+    ]}
+    messages = [{"role": "user", "content": "什么是AI产品经理？"}]
+    for hedge in (False, True):
+        pool = build_pool(dict(config, hedge=hedge))
+        latencies, failures = [], 0
+
+        def one(_):
+            started = time.perf_counter()
+            if not args.stream:
+                pool.create(messages=messages)
+                return time.perf_counter() - started
+            ttft = None
+            for _chunk in pool.create(messages=messages, stream=True):
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+            return ttft
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            for future in [executor.submit(one, i) for i in range(args.requests)]:
+                try:
+                    latencies.append(future.result())
+                except Exception:
+                    failures += 1
+        latencies.sort()
+        print(f"对冲={'开' if hedge else '关'}: 成功 {len(latencies)}，失败 {failures}，"
+              f"p50 {statistics.median(latencies) * 1000:.0f} ms，"
+              f"p95 {latencies[int(0.95 * len(latencies)) - 1] * 1000:.0f} ms，"
+              f"p99 {latencies[int(0.99 * len(latencies)) - 1] * 1000:.0f} ms，"
+              f"最大 {latencies[-1] * 1000:.0f} ms")
+        for status in pool.status():
+            print("   ", status)
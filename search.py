@@ -0,0 +1,380 @@
+import math
+import re
+import threading
+from array import array
+
+import numpy as np
+
+from storage import CATEGORIES, STARRED_VIEW
+
+# 卡片全文检索：倒排索引 + BM25 排序
+# 中文按字的二元组（bigram）切分，英文/数字按单词切分，无需额外的分词依赖。
+# 索引中的词用整数编号（汉字二元组直接由两个码位拼成），建索引时用NumPy整批切分、排序，
+# 倒排表存成按词排序的紧凑数组（CSR）；之后新增的卡片先进入一个小的增量表，积累到一定数量再合并。
+# 检索时先求出属于该分类且命中全部查询词的行，只对这些行用NumPy批量计算BM25，再只对得分最高的前k个排序
+
+_TOKEN_RE = re.compile(r"[一-鿿]+|[a-z0-9]+")
+_CJK_RE = re.compile(r"[一-鿿]")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+QUESTION_BOOST = 3  # 问题命中的权重高于回答
+K1 = 1.2
+B = 0.75
+
+CJK_FIRST, CJK_LAST = 0x4E00, 0x9FFF
+CP_BITS = 21                # 汉字二元组的编号: 首字码位 << 21 | 次字码位；单字的编号就是码位
+WORD_BASE = 1 << 40         # 英文/数字单词的编号: WORD_BASE + 词表序号
+ROW_BITS = 22               # 建索引排序时把 (词编号, 行号) 拼成一个int64
+BUILD_CHUNK = 2000          # 建索引时每批切分的卡片数
+MERGE_MIN = 50000           # 增量表中的倒排条目超过该值（且超过主表的10%）时合并进主表
+
+
+def tokenize(text):
+    """中文连续片段切成二元组（单字片段保留单字），英文数字按词切分"""
+    tokens = []
+    for run in _TOKEN_RE.findall(text.lower()):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def make_snippet(text, query, width=80):
+    """截取第一个命中位置附近的片段，并用Markdown加粗命中的词"""
+    lowered = text.lower()
+    needles = [query.strip().lower()] + sorted(set(_TOKEN_RE.findall(query.lower())), key=len, reverse=True)
+    pos = -1
+    for needle in needles:
+        if needle:
+            pos = lowered.find(needle)
+            if pos >= 0:
+                break
+    if pos < 0:
+        return text[:width].replace("\n", " ")
+    start = max(0, pos - width // 4)
+    end = min(len(text), start + width)
+    snippet = text[start:end].replace("\n", " ")
+    match = snippet[pos - start:pos - start + len(needle)]
+    if match:
+        snippet = snippet.replace(match, f"**{match}**", 1)
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
+
+
+class SearchIndex:
+    def __init__(self, store):
+        """在CardStore之上建立倒排索引，随store的增删增量更新。每张卡片占一个行号"""
+        self.store = store
+        self._lock = threading.RLock()
+        # store的变更回调在持有store锁（以及跨进程文件锁）时调用，这里只登记待处理的变更，
+        # 真正的索引更新推迟到下一次检索时、在store的锁之外进行
+        self._pending_lock = threading.Lock()
+        self._pending = {}   # card_id -> "add" / "star" / "delete"
+        self._stale = False  # 收到 reset，需要整体重建
+        self._words = {}     # 英文/数字单词 -> 词表序号
+        self.rebuild()
+        store.subscribe(self._on_change)
+
+    # ---------- 分词 ----------
+
+    def _term_keys(self, text, add_words=True):
+        """文本中全部词的整数编号（含重复）。add_words 为 False 时不登记新单词（查询用）"""
+        text = text.lower()
+        cps = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+        cjk = (cps >= CJK_FIRST) & (cps <= CJK_LAST)
+        pair = cjk[:-1] & cjk[1:]
+        bigrams = ((cps[:-1] << CP_BITS) | cps[1:])[pair]
+        # 前后都不是汉字的单个汉字保留单字
+        alone = cjk.copy()
+        alone[1:] &= ~cjk[:-1]
+        alone[:-1] &= ~cjk[1:]
+        keys = [bigrams, cps[alone]]
+        words = _WORD_RE.findall(text)
+        if words:
+            ids = []
+            for word in words:
+                index = self._words.get(word)
+                if index is None:
+                    if not add_words:
+                        index = -1
+                    else:
+                        index = self._words[word] = len(self._words)
+                ids.append(WORD_BASE + index)
+            keys.append(np.array(ids, dtype=np.int64))
+        return np.concatenate(keys)
+
+    def _card_keys(self, card):
+        """(词编号, 权重)：问题中的词按 QUESTION_BOOST 加权"""
+        answer_keys = self._term_keys(self.store.answer(card["id"]) or "")
+        question_keys = self._term_keys(card["question"])
+        keys = np.concatenate([answer_keys, question_keys])
+        weights = np.ones(len(keys), dtype=np.float32)
+        weights[len(answer_keys):] = QUESTION_BOOST
+        return keys, weights
+
+    # ---------- 建索引 ----------
+
+    def rebuild(self):
+        with self._lock:
+            self.ids = []          # 行号 -> card_id
+            self.rows = {}         # card_id -> 行号（已删除的卡片不在其中）
+            self._doc_len = array("f")
+            self._category = array("b")  # 分类编号，见 _category_code
+            self._starred = array("b")
+            self._alive = array("b")      # 删除或被覆盖的行置0，倒排表中的条目在合并时才清除
+            self._categories = {}
+            self.total_len = 0.0
+            parts = []
+            keys, rows, weights = [], [], []
+            for card in self.store.all_cards():
+                row = self._add_row(card)
+                card_keys, card_weights = self._card_keys(card)
+                keys.append(card_keys)
+                weights.append(card_weights)
+                rows.append(np.full(len(card_keys), row, dtype=np.int64))
+                self._doc_len[row] = card_weights.sum()
+                self.total_len += self._doc_len[row]
+                if len(keys) >= BUILD_CHUNK:
+                    parts.append(_aggregate(keys, rows, weights))
+                    keys, rows, weights = [], [], []
+            if keys:
+                parts.append(_aggregate(keys, rows, weights))
+            self._set_base(parts)
+
+    def _add_row(self, card):
+        row = len(self.ids)
+        if row >= 1 << ROW_BITS:
+            raise OverflowError("卡片数超过检索索引的上限")
+        self.ids.append(card["id"])
+        self.rows[card["id"]] = row
+        self._doc_len.append(0.0)
+        self._category.append(self._category_code(card["category"]))
+        self._starred.append(card["starred"])
+        self._alive.append(1)
+        return row
+
+    def _set_base(self, parts):
+        """parts 为按行号先后排列的 (词编号, 行号, 词频)，合并成按词排序的主表"""
+        if parts:
+            keys = np.concatenate([part[0] for part in parts])
+            rows = np.concatenate([part[1] for part in parts])
+            tfs = np.concatenate([part[2] for part in parts])
+            # 稳定排序：同一个词的行号保持递增
+            order = np.argsort(keys, kind="stable")
+            keys, rows, tfs = keys[order], rows[order], tfs[order]
+        else:
+            keys = np.zeros(0, dtype=np.int64)
+            rows = np.zeros(0, dtype=np.int32)
+            tfs = np.zeros(0, dtype=np.float32)
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.zeros(0, dtype=np.int64)
+        self._keys = keys[starts]
+        self._starts = np.r_[starts, len(keys)]
+        self._rows = rows.astype(np.int32)
+        self._tfs = tfs.astype(np.float32)
+        # 按次字排序的二元组，供单字查询找出"某字在后"的二元组
+        bigram = (self._keys >= CJK_FIRST << CP_BITS) & (self._keys < WORD_BASE)
+        positions = np.flatnonzero(bigram)
+        swapped = ((self._keys[positions] & ((1 << CP_BITS) - 1)) << CP_BITS) | (self._keys[positions] >> CP_BITS)
+        order = np.argsort(swapped)
+        self._second_keys = swapped[order]
+        self._second_pos = positions[order]
+        self._delta = {}        # 词编号 -> (行号 array('i'), 词频 array('f'))，主表之后新增的卡片
+        self._delta_chars = {}  # 单个汉字 -> 增量表中包含它的二元组编号
+        self._delta_size = 0
+
+    def _merge(self):
+        """把增量表合并进主表，并丢弃已删除的行（行号重新编排）"""
+        alive = np.array(self._alive, dtype=np.bool_)
+        new_row = np.cumsum(alive) - 1
+        keys = [np.repeat(self._keys, np.diff(self._starts))]
+        rows = [self._rows]
+        tfs = [self._tfs]
+        for key, (delta_rows, delta_tfs) in self._delta.items():
+            keys.append(np.full(len(delta_rows), key, dtype=np.int64))
+            rows.append(np.array(delta_rows, dtype=np.int32))
+            tfs.append(np.array(delta_tfs, dtype=np.float32))
+        keys, rows, tfs = np.concatenate(keys), np.concatenate(rows), np.concatenate(tfs)
+        keep = alive[rows]
+        keys, rows, tfs = keys[keep], new_row[rows[keep]], tfs[keep]
+        order = np.lexsort((rows, keys))
+        self.ids = [card_id for card_id, flag in zip(self.ids, alive) if flag]
+        self.rows = {card_id: row for row, card_id in enumerate(self.ids)}
+        for name in ("_doc_len", "_category", "_starred", "_alive"):
+            old = getattr(self, name)
+            setattr(self, name, array(old.typecode, np.array(old)[alive].tolist()))
+        self._set_base([(keys[order], rows[order], tfs[order])])
+
+    # ---------- 增量更新 ----------
+
+    def _on_change(self, op, card_id, card):
+        with self._pending_lock:
+            if op == "reset":
+                self._stale = True
+                self._pending = {}
+            elif op == "star":
+                # 只有收藏状态变化时不必重新分词；已登记为 add 的保持 add
+                self._pending.setdefault(card_id, "star")
+            elif op in ("add", "delete"):
+                self._pending[card_id] = op
+
+    def _sync(self):
+        """应用积压的变更；增量表过大或删除过半时合并"""
+        with self._pending_lock:
+            stale, pending = self._stale, self._pending
+            self._stale, self._pending = False, {}
+        with self._lock:
+            if stale:
+                self.rebuild()
+                return
+            for card_id, op in pending.items():
+                card = self.store.get(card_id)
+                if card is None or op == "delete":
+                    self.remove(card_id)
+                elif op == "star" and card_id in self.rows:
+                    self._starred[self.rows[card_id]] = card["starred"]
+                else:
+                    self.add(card)
+            if self._delta_size > max(MERGE_MIN, len(self._rows) // 10) or \
+                    len(self.ids) > 2 * len(self.rows) + 1000:
+                self._merge()
+
+    def _category_code(self, category):
+        code = self._categories.get(category)
+        if code is None:
+            code = self._categories[category] = len(self._categories)
+        return code
+
+    def add(self, card):
+        with self._lock:
+            self.remove(card["id"])
+            row = self._add_row(card)
+            keys, weights = self._card_keys(card)
+            keys, inverse = np.unique(keys, return_inverse=True)
+            tfs = np.bincount(inverse, weights=weights)
+            for key, tf in zip(keys.tolist(), tfs.tolist()):
+                docs = self._delta.get(key)
+                if docs is None:
+                    docs = self._delta[key] = (array("i"), array("f"))
+                    if CJK_FIRST << CP_BITS <= key < WORD_BASE:
+                        for ch in (key >> CP_BITS, key & ((1 << CP_BITS) - 1)):
+                            self._delta_chars.setdefault(ch, set()).add(key)
+                docs[0].append(row)
+                docs[1].append(tf)
+            self._delta_size += len(keys)
+            self._doc_len[row] = weights.sum()
+            self.total_len += self._doc_len[row]
+
+    def remove(self, card_id):
+        with self._lock:
+            row = self.rows.pop(card_id, None)
+            if row is None:
+                return
+            self._alive[row] = 0
+            self.total_len -= self._doc_len[row]
+
+    # ---------- 检索 ----------
+
+    def _base_slices(self, positions):
+        return [(self._rows[self._starts[i]:self._starts[i + 1]], self._tfs[self._starts[i]:self._starts[i + 1]])
+                for i in positions]
+
+    def _term_frequencies(self, key):
+        """该词在每一行中的加权词频（长度为行数的稠密向量，未出现为0）"""
+        parts = []
+        i = np.searchsorted(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            parts.extend(self._base_slices([i]))
+        docs = self._delta.get(key)
+        if docs is not None:
+            parts.append((np.array(docs[0], dtype=np.int32), np.array(docs[1], dtype=np.float32)))
+        if CJK_FIRST <= key <= CJK_LAST:
+            # 单字查询：合并单字本身与所有包含该字的二元组
+            lo, hi = np.searchsorted(self._keys, [key << CP_BITS, (key + 1) << CP_BITS])
+            bounds = np.searchsorted(self._second_keys, [key << CP_BITS, (key + 1) << CP_BITS])
+            parts.extend(self._base_slices(np.union1d(np.arange(lo, hi), self._second_pos[slice(*bounds)])))
+            for bigram in self._delta_chars.get(key, ()):
+                docs = self._delta[bigram]
+                parts.append((np.array(docs[0], dtype=np.int32), np.array(docs[1], dtype=np.float32)))
+        dense = np.zeros(len(self.ids), dtype=np.float32)
+        if len(parts) == 1:
+            # 同一个词的行号不重复，可以直接赋值
+            dense[parts[0][0].astype(np.intp)] = parts[0][1]
+        elif parts:
+            np.add.at(dense, np.concatenate([p[0] for p in parts]).astype(np.intp),
+                      np.concatenate([p[1] for p in parts]))
+        return dense
+
+    def _allowed(self, category):
+        """可出现在结果中的行：未删除且属于指定分类（"重点标注学习"为已收藏且属于五个分类）"""
+        allowed = np.array(self._alive, dtype=np.bool_)
+        if category == STARRED_VIEW:
+            codes = np.array(self._category, dtype=np.int8)
+            allowed &= np.array(self._starred, dtype=np.bool_)
+            allowed &= np.isin(codes, [self._categories[c] for c in CATEGORIES if c in self._categories])
+        elif category is not None:
+            code = self._categories.get(category)
+            if code is None:
+                return None
+            allowed &= np.array(self._category, dtype=np.int8) == code
+        return allowed
+
+    def search(self, query, category=None, limit=None):
+        """返回按BM25得分降序的 [(card, score)]，要求命中全部查询词。
+        category 为分类名时只返回该分类，为"重点标注学习"时只返回已收藏的卡片；
+        先按分类与命中情况过滤再计分，指定 limit 时只对得分最高的 limit 个排序"""
+        self._sync()
+        with self._lock:
+            query_keys = list(dict.fromkeys(self._term_keys(query, add_words=False).tolist()))
+            if not query_keys or not self.ids:
+                return []
+            allowed = self._allowed(category)
+            if allowed is None:
+                return []
+            n_docs = len(self.rows) or 1
+            avg_len = self.total_len / n_docs or 1.0
+            alive = np.array(self._alive, dtype=np.bool_) if len(self.ids) > len(self.rows) else None
+            frequencies = [self._term_frequencies(key) for key in query_keys]
+            # 先求出属于该分类且命中全部查询词的行，只对这些行计分
+            candidates = allowed
+            dfs = []
+            for tf in frequencies:
+                present = tf > 0
+                dfs.append(np.count_nonzero(present if alive is None else present & alive))
+                candidates &= present
+            candidates = np.flatnonzero(candidates)
+            if not len(candidates):
+                return []
+            doc_len = np.array(self._doc_len, dtype=np.float32)[candidates]
+            norm = K1 * (1 - B + B * doc_len / avg_len)
+            candidate_scores = np.zeros(len(candidates), dtype=np.float32)
+            for tf, df in zip(frequencies, dfs):
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                tf = tf[candidates]
+                candidate_scores += idf * (K1 + 1) * tf / (tf + norm)
+            if limit is not None and len(candidates) > limit:
+                top = np.argpartition(-candidate_scores, limit - 1)[:limit]
+                candidates, candidate_scores = candidates[top], candidate_scores[top]
+            order = np.argsort(-candidate_scores, kind="stable")
+            ranked = [(self.ids[row], float(score)) for row, score in
+                      zip(candidates[order].tolist(), candidate_scores[order].tolist())]
+        results = []
+        for card_id, score in ranked:
+            card = self.store.get(card_id)
+            if card is not None:
+                results.append((card, score))
+        return results
+
+
+def _aggregate(keys, rows, weights):
+    """把一批卡片的 (词编号, 行号, 权重) 聚合为去重后的 (词编号, 行号, 词频)，按 (词编号, 行号) 排序"""
+    keys, rows, weights = np.concatenate(keys), np.concatenate(rows), np.concatenate(weights)
+    combined = (keys << ROW_BITS) | rows
+    order = np.argsort(combined)
+    combined, weights = combined[order], weights[order]
+    starts = np.flatnonzero(np.r_[True, combined[1:] != combined[:-1]])
+    combined = combined[starts]
+    return combined >> ROW_BITS, (combined & ((1 << ROW_BITS) - 1)).astype(np.int32), \
+        np.add.reduceat(weights, starts).astype(np.float32)
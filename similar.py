@@ -0,0 +1,176 @@
+import re
+import threading
+import unicodedata
+import zlib
+
+import numpy as np
+
+# 相似问题检索：把问题文本的字符 2/3-gram 哈希成定长向量（L2归一化），
+# 存成一个 NumPy 矩阵，用一次矩阵乘法算出与全部卡片的余弦相似度，不依赖任何外部模型。
+# 与 search.SearchIndex 一样，store的变更回调（持有store锁）只登记变更，检索前在锁外应用
+
+DIM = 512
+NGRAM_SIZES = (2, 3)
+
+_NOISE_RE = re.compile(r"[\s\W_]+")
+
+
+def _normalize(text):
+    return _NOISE_RE.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def embed(text, dim=DIM):
+    """字符n-gram哈希向量；crc32 保证不同进程之间哈希结果一致"""
+    vec = np.zeros(dim, dtype=np.float32)
+    text = _normalize(text)
+    if not text:
+        return vec
+    for n in NGRAM_SIZES:
+        if len(text) < n:
+            continue
+        for i in range(len(text) - n + 1):
+            vec[zlib.crc32(text[i:i + n].encode("utf-8")) % dim] += 1.0
+    if not vec.any():
+        vec[zlib.crc32(text.encode("utf-8")) % dim] = 1.0
+    np.sqrt(vec, out=vec)  # 次线性词频，削弱高频n-gram的影响
+    vec /= np.linalg.norm(vec)
+    return vec
+
+
+class SimilarityIndex:
+    def __init__(self, store, dim=DIM, include_answer=False):
+        """在CardStore之上建立向量索引，随store的增删增量更新。
+        include_answer 为 True 时把回答开头的一段也计入向量"""
+        self.store = store
+        self.dim = dim
+        self.include_answer = include_answer
+        self.matrix = np.zeros((0, dim), dtype=np.float32)
+        self.ids = []       # 行号 -> card_id
+        self.rows = {}      # card_id -> 行号
+        self._lock = threading.RLock()
+        self._pending_lock = threading.Lock()
+        self._pending = {}   # card_id -> "add"/"delete"，尚未应用的变更
+        self._stale = False  # 收到 reset，下次检索前整体重建
+        self.rebuild()
+        store.subscribe(self._on_change)
+
+    def _text(self, card):
+        if self.include_answer:
+            return card["question"] + " " + (self.store.answer(card["id"]) or "")[:200]
+        return card["question"]
+
+    def rebuild(self):
+        with self._lock:
+            cards = self.store.all_cards()
+            self.ids = [card["id"] for card in cards]
+            self.rows = {card_id: row for row, card_id in enumerate(self.ids)}
+            self.matrix = np.zeros((max(16, len(cards)), self.dim), dtype=np.float32)
+            for row, card in enumerate(cards):
+                self.matrix[row] = embed(self._text(card), self.dim)
+
+    def _on_change(self, op, card_id, card):
+        # 回调在store的锁内执行：只登记，不在这里重新计算向量（收藏状态变化与向量无关）
+        with self._pending_lock:
+            if op == "reset":
+                self._stale = True
+                self._pending = {}
+            elif op in ("add", "delete"):
+                self._pending[card_id] = op
+
+    def _sync(self):
+        """应用积压的变更，收到过 reset 时整体重建"""
+        with self._pending_lock:
+            stale, pending = self._stale, self._pending
+            self._stale, self._pending = False, {}
+        if stale:
+            self.rebuild()
+            return
+        for card_id, op in pending.items():
+            card = self.store.get(card_id) if op == "add" else None
+            if card is None:
+                self.remove(card_id)
+            else:
+                self.add(card)
+
+    def add(self, card):
+        with self._lock:
+            row = self.rows.get(card["id"])
+            if row is None:
+                row = len(self.ids)
+                if row >= len(self.matrix):
+                    # 容量翻倍，均摊后每次新增为O(dim)
+                    grown = np.zeros((len(self.matrix) * 2, self.dim), dtype=np.float32)
+                    grown[:row] = self.matrix[:row]
+                    self.matrix = grown
+                self.ids.append(card["id"])
+                self.rows[card["id"]] = row
+            self.matrix[row] = embed(self._text(card), self.dim)
+
+    def remove(self, card_id):
+        with self._lock:
+            row = self.rows.pop(card_id, None)
+            if row is None:
+                return
+            # 用最后一行填补被删除的行，保持矩阵前 len(ids) 行紧凑
+            last = len(self.ids) - 1
+            if row != last:
+                moved_id = self.ids[last]
+                self.matrix[row] = self.matrix[last]
+                self.ids[row] = moved_id
+                self.rows[moved_id] = row
+            self.matrix[last] = 0
+            self.ids.pop()
+
+    def similar(self, text, k=5, threshold=0.35, exclude_id=None):
+        """返回与 text 最相似的 [(card, score)]，按相似度降序"""
+        query = embed(text, self.dim)
+        if not query.any():
+            return []
+        self._sync()
+        with self._lock:
+            n = len(self.ids)
+            if n == 0:
+                return []
+            scores = self.matrix[:n] @ query
+            top = min(k + 1, n)
+            candidates = np.argpartition(-scores, top - 1)[:top]
+            candidates = candidates[np.argsort(-scores[candidates])]
+            ids = [self.ids[row] for row in candidates]
+            top_scores = [float(scores[row]) for row in candidates]
+        results = []
+        for card_id, score in zip(ids, top_scores):
+            if score < threshold or card_id == exclude_id:
+                continue
+            card = self.store.get(card_id)
+            if card is not None:
+                results.append((card, score))
+            if len(results) >= k:
+                break
+        return results
+
+    def duplicates(self, threshold=0.9, block=1024):
+        """找出相似度不低于 threshold 的卡片对 [(id_a, id_b, score)]，按块做矩阵乘法控制内存"""
+        pairs = []
+        self._sync()
+        with self._lock:
+            n = len(self.ids)
+            matrix = self.matrix[:n]
+            for begin in range(0, n, block):
+                scores = matrix[begin:begin + block] @ matrix.T
+                rows, cols = np.nonzero(scores >= threshold)
+                for r, c in zip(rows, cols):
+                    a = begin + int(r)
+                    if a < c:
+                        pairs.append((self.ids[a], self.ids[int(c)], float(scores[r, c])))
+        pairs.sort(key=lambda pair: pair[2], reverse=True)
+        return pairs
+
+
+if __name__ == "__main__":
+    # 用法: python similar.py   列出卡片库（CARD_STORE_BACKEND 指定的后端）中疑似重复的问题
+    from storage import open_store
+
+    store = open_store()
+    index = SimilarityIndex(store)
+    for id_a, id_b, score in index.duplicates():
+        print(f"{score:.3f}  {store.get(id_a)['question']}  <->  {store.get(id_b)['question']}")
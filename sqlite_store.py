@@ -0,0 +1,379 @@
+import sqlite3
+import threading
+import uuid
+
+from metrics import metrics
+from search import tokenize
+from storage import (CATEGORIES, DATA_FILE, STARRED_VIEW, CardStore, ConflictError,
+                     normalize_card, now_timestamp)
+
+# 可选的SQLite存储后端，对外接口与 storage.CardStore 一致。
+# (category, timestamp) 与收藏的部分索引让分类页只读取当前页的行；
+# FTS5（trigram分词，支持中文子串）提供全文检索；trigram要求词至少3个字符，而中文检索词多为两个字，
+# 因此另建一张unicode61分词的FTS5表，写入预先切好的中文二元组（与 search.tokenize 相同），
+# 两个字的词也能走倒排索引。该表不保存原文（content=''），由触发器调用本连接注册的 bigrams() 维护；
+# 触发器同时把每次增删改记入 card_changes，其他连接写入后 refresh() 按这张表逐张通知订阅者，
+# 搜索/相似/复习索引只需增量更新；WAL模式下多个读者不阻塞写者
+
+DB_FILE = "questions&answers.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    category TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    starred INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_cards_category_ts ON cards(category, timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_cards_starred_ts ON cards(timestamp DESC) WHERE starred = 1;
+CREATE VIRTUAL TABLE IF NOT EXISTS cards_fts USING fts5(
+    question, answer, content='cards', content_rowid='rowid', tokenize='trigram'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS cards_bigram USING fts5(
+    question, answer, content='', tokenize='unicode61'
+);
+CREATE TABLE IF NOT EXISTS card_changes (
+    seq INTEGER PRIMARY KEY,
+    card_id TEXT NOT NULL,
+    op TEXT NOT NULL
+);
+"""
+
+TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS cards_ai AFTER INSERT ON cards BEGIN
+    INSERT INTO cards_fts(rowid, question, answer) VALUES (new.rowid, new.question, new.answer);
+    INSERT INTO cards_bigram(rowid, question, answer) VALUES (new.rowid, bigrams(new.question), bigrams(new.answer));
+END""",
+    """CREATE TRIGGER IF NOT EXISTS cards_ad AFTER DELETE ON cards BEGIN
+    INSERT INTO cards_fts(cards_fts, rowid, question, answer) VALUES ('delete', old.rowid, old.question, old.answer);
+    INSERT INTO cards_bigram(cards_bigram, rowid, question, answer)
+        VALUES ('delete', old.rowid, bigrams(old.question), bigrams(old.answer));
+END""",
+    """CREATE TRIGGER IF NOT EXISTS cards_au AFTER UPDATE OF question, answer ON cards BEGIN
+    INSERT INTO cards_fts(cards_fts, rowid, question, answer) VALUES ('delete', old.rowid, old.question, old.answer);
+    INSERT INTO cards_fts(rowid, question, answer) VALUES (new.rowid, new.question, new.answer);
+    INSERT INTO cards_bigram(cards_bigram, rowid, question, answer)
+        VALUES ('delete', old.rowid, bigrams(old.question), bigrams(old.answer));
+    INSERT INTO cards_bigram(rowid, question, answer) VALUES (new.rowid, bigrams(new.question), bigrams(new.answer));
+END""",
+    """CREATE TRIGGER IF NOT EXISTS card_changes_ai AFTER INSERT ON cards BEGIN
+    INSERT INTO card_changes(card_id, op) VALUES (new.id, 'add');
+END""",
+    """CREATE TRIGGER IF NOT EXISTS card_changes_ad AFTER DELETE ON cards BEGIN
+    INSERT INTO card_changes(card_id, op) VALUES (old.id, 'delete');
+END""",
+    # 只有收藏状态（与版本号）变化时记为 star，订阅者不必重新处理问题与回答
+    """CREATE TRIGGER IF NOT EXISTS card_changes_au AFTER UPDATE ON cards BEGIN
+    INSERT INTO card_changes(card_id, op) VALUES (new.id,
+        CASE WHEN old.category IS new.category AND old.question IS new.question
+                  AND old.answer IS new.answer AND old.timestamp IS new.timestamp THEN 'star' ELSE 'add' END);
+END""",
+)
+SCHEMA_VERSION = 2  # 1: 新增 cards_bigram 表及维护它的触发器；2: 新增 card_changes 变更日志
+CHANGE_LOG_KEEP = 10000    # card_changes 保留的最近变更条数，落后更多的连接收到 reset
+CHANGE_NOTIFY_MAX = 5000   # 一次 refresh 中变化的卡片超过该数量时直接通知 reset
+
+COLUMNS = "id, category, question, answer, timestamp, starred, version"
+
+# category 前的一元加号让规划器不走分类索引，而是使用收藏的部分索引
+_STARRED_WHERE = f"starred = 1 AND +category IN ({', '.join('?' for _ in CATEGORIES)})"
+
+
+def bigrams(text):
+    """切成空格分隔的中文二元组/英文单词，供unicode61分词的 cards_bigram 表使用"""
+    return " ".join(tokenize(text))
+
+
+def _bigram_phrase(term):
+    """检索词对应的 cards_bigram 短语；含单个汉字（二元组索引无法前后缀匹配）或没有可检索的字符时返回None"""
+    tokens = tokenize(term)
+    if not tokens or any(len(token) == 1 and token >= "\u4e00" for token in tokens):
+        return None
+    return '"' + " ".join(tokens) + '"'
+
+
+def _row_to_card(row):
+    return {
+        "id": row[0],
+        "category": row[1],
+        "question": row[2],
+        "answer": row[3],
+        "timestamp": row[4],
+        "starred": bool(row[5]),
+        "version": row[6],
+    }
+
+
+class SQLiteCardStore:
+    def __init__(self, db_file=DB_FILE):
+        """打开（必要时创建）SQLite卡片库，开启WAL"""
+        self.db_file = db_file
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.create_function("bigrams", 1, bigrams, deterministic=True)
+        self._conn.executescript(SCHEMA + ";\n".join(TRIGGERS) + ";")
+        self._migrate_schema()
+        self.generation = 0
+        self._views = {}
+        self._listeners = []
+        self.stats = {"parses": 0, "parses_avoided": 0}
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._change_seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM card_changes").fetchone()[0]
+
+    def _migrate_schema(self):
+        """旧版本创建的库：替换触发器（CREATE TRIGGER IF NOT EXISTS 不会覆盖旧定义）并补建 cards_bigram 的索引。
+        在一个写事务中执行一次，完成后记录在 user_version 中"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            self._conn.rollback()
+            return
+        with metrics.timer("storage_io_seconds", op="sqlite_migrate"):
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+                for name in ("cards_ai", "cards_ad", "cards_au"):
+                    self._conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+                for trigger in TRIGGERS:
+                    self._conn.execute(trigger)
+                self._conn.execute("INSERT INTO cards_bigram(rowid, question, answer) "
+                                   "SELECT rowid, bigrams(question), bigrams(answer) FROM cards")
+            # 版本2的 card_changes 表与触发器在打开时已按 IF NOT EXISTS 创建
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._conn.commit()
+
+    def close(self):
+        """关闭连接；最后一个连接关闭时SQLite会把WAL合并回主库文件"""
+        with self._lock:
+            self._conn.close()
+
+    # ---------- 读取 ----------
+
+    def subscribe(self, callback):
+        """注册变更回调 callback(op, card_id, card)，与 CardStore 相同"""
+        self._listeners.append(callback)
+
+    def _notify(self, op, card_id, card):
+        for callback in self._listeners:
+            callback(op, card_id, card)
+
+    def _bump(self):
+        self.generation += 1
+        self._views = {}
+
+    def refresh(self):
+        """其他连接提交过写入（PRAGMA data_version 变化）时丢弃缓存的视图，
+        并按 card_changes 逐张通知订阅者（与 CardStore.load 相同）。返回是否失效"""
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                self.stats["parses_avoided"] += 1
+                return False
+            self._data_version = data_version
+            self.stats["parses"] += 1
+            self._bump()
+            self._notify_changes()
+            return True
+
+    def _notify_changes(self):
+        rows = self._conn.execute("SELECT seq, card_id, op FROM card_changes WHERE seq > ? ORDER BY seq",
+                                  (self._change_seq,)).fetchall()
+        if not rows:
+            return
+        # 序号连续；第一条不紧接上次读到的位置说明中间的变更已被清理
+        missed = rows[0][0] > self._change_seq + 1
+        self._change_seq = rows[-1][0]
+        ops = {}
+        for _, card_id, op in rows:
+            ops.setdefault(card_id, set()).add(op)
+        if missed or len(ops) > CHANGE_NOTIFY_MAX:
+            self._notify("reset", None, None)
+            return
+        for card_id, kinds in ops.items():
+            card = self.get(card_id)
+            if card is None:
+                self._notify("delete", card_id, None)
+            elif kinds == {"star"}:
+                self._notify("star", card_id, card)
+            else:
+                self._notify("add", card_id, card)
+
+    def _where(self, category):
+        if category == STARRED_VIEW:
+            return _STARRED_WHERE, list(CATEGORIES)
+        return "category = ?", [category]
+
+    def get(self, card_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {COLUMNS} FROM cards WHERE id = ?", (card_id,)).fetchone()
+        return _row_to_card(row) if row else None
+
+    def answer(self, card_id):
+        with self._lock:
+            row = self._conn.execute("SELECT answer FROM cards WHERE id = ?", (card_id,)).fetchone()
+        return row[0] if row else None
+
+    def all_cards(self):
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {COLUMNS} FROM cards ORDER BY rowid").fetchall()
+        return [_row_to_card(row) for row in rows]
+
+    def count(self, category):
+        where, params = self._where(category)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM cards WHERE {where}", params).fetchone()[0]
+
+    def page(self, category, offset=0, limit=20):
+        """只读取当前页的行（走 (category, timestamp) 索引）"""
+        where, params = self._where(category)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {COLUMNS} FROM cards WHERE {where} ORDER BY timestamp DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [_row_to_card(row) for row in rows]
+
+    def view(self, category):
+        """整个分类的卡片（按时间倒序），在同一写入代数内缓存"""
+        with self._lock:
+            items = self._views.get(category)
+            if items is None:
+                items = self.page(category, 0, -1)
+                self._views[category] = items
+            return items
+
+    def search(self, query, category=None, limit=None):
+        """FTS5全文检索，返回 [(card, score)]，接口与 search.SearchIndex.search 一致。
+        每个词都不少于3个字符时查trigram表；有更短的词时查二元组表；
+        含单个汉字的词二元组表也无法命中，退化为LIKE匹配"""
+        terms = query.split()
+        if not terms:
+            return []
+        filters, params = [], []
+        if category is not None:
+            where, where_params = self._where(category)
+            filters.append(where)
+            params.extend(where_params)
+        if all(len(term) >= 3 for term in terms):
+            fts_table = "cards_fts"
+            phrases = ['"' + term.replace('"', '""') + '"' for term in terms]
+        else:
+            fts_table = "cards_bigram"
+            phrases = [_bigram_phrase(term) for term in terms]
+        if None not in phrases:
+            sql = ("SELECT c.id, c.category, c.question, c.answer, c.timestamp, c.starred, c.version, "
+                   f"-bm25({fts_table}, 3.0, 1.0) AS score "
+                   f"FROM {fts_table} JOIN cards c ON c.rowid = {fts_table}.rowid "
+                   f"WHERE {fts_table} MATCH ?{''.join(' AND ' + f for f in filters)} ORDER BY score DESC")
+            params = [" AND ".join(phrases)] + params
+        else:
+            for term in terms:
+                filters.append("(question LIKE ? OR answer LIKE ?)")
+                params.extend([f"%{term}%", f"%{term}%"])
+            sql = f"SELECT {COLUMNS}, 0 AS score FROM cards WHERE {' AND '.join(filters)} ORDER BY timestamp DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [(_row_to_card(row[:7]), row[7]) for row in rows]
+
+    # ---------- 写入 ----------
+
+    def _commit(self):
+        # 持有写事务时没有其他连接能写入：若上次 refresh 之后也没有其他连接提交过，
+        # 变更日志中新增的都是本连接的写入（已直接通知过），跳过它们；清理过旧的日志
+        if self._conn.execute("PRAGMA data_version").fetchone()[0] == self._data_version:
+            self._change_seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM card_changes").fetchone()[0]
+        self._conn.execute("DELETE FROM card_changes WHERE seq <= (SELECT MAX(seq) FROM card_changes) - ?",
+                           (CHANGE_LOG_KEEP,))
+        with metrics.timer("storage_io_seconds", op="sqlite_commit"):
+            self._conn.commit()
+        # 自己的提交不会改变 data_version，这里直接让本进程的视图失效
+        self._bump()
+
+    def add(self, question, answer, category, card_id=None, timestamp=None, starred=False):
+        return self.add_many([{
+            "id": card_id or str(uuid.uuid4()),
+            "category": category,
+            "question": question,
+            "answer": answer,
+            "timestamp": timestamp or now_timestamp(),
+            "starred": starred,
+        }])[0]
+
+    def add_many(self, items, overwrite=True):
+        """批量新增卡片，单个事务提交。id已存在时覆盖并递增版本号；
+        overwrite 为False时跳过已存在的id（ON CONFLICT DO NOTHING）。返回实际写入的卡片"""
+        cards = [normalize_card(item) for item in items]
+        on_conflict = ("DO UPDATE SET category = excluded.category, question = excluded.question, "
+                       "answer = excluded.answer, timestamp = excluded.timestamp, starred = excluded.starred, "
+                       "version = cards.version + 1" if overwrite else "DO NOTHING")
+        written = []
+        with self._lock:
+            for card in cards:
+                row = self._conn.execute(
+                    "INSERT INTO cards (id, category, question, answer, timestamp, starred, version) "
+                    f"VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) {on_conflict} RETURNING version",
+                    (card["id"], card["category"], card["question"], card["answer"],
+                     card["timestamp"], int(card["starred"]), card["version"])
+                ).fetchone()
+                if row is not None:
+                    card["version"] = row[0]
+                    written.append(card)
+            self._commit()
+        for card in written:
+            self._notify("add", card["id"], card)
+        return written
+
+    def _update(self, card_id, expected_version, sql, params):
+        """执行带版本检查的更新；卡片不存在返回False，版本不一致抛出ConflictError"""
+        with self._lock:
+            if expected_version is None:
+                cursor = self._conn.execute(sql + " WHERE id = ?", params + [card_id])
+            else:
+                cursor = self._conn.execute(sql + " WHERE id = ? AND version = ?",
+                                            params + [card_id, expected_version])
+            if cursor.rowcount == 0:
+                row = self._conn.execute("SELECT version FROM cards WHERE id = ?", (card_id,)).fetchone()
+                self._conn.rollback()
+                if row is None:
+                    return False
+                raise ConflictError(f"卡片 {card_id} 已被修改（当前版本 {row[0]}，预期 {expected_version}）")
+            self._commit()
+            return True
+
+    def set_starred(self, card_id, starred=True, expected_version=None):
+        updated = self._update(card_id, expected_version,
+                               "UPDATE cards SET starred = ?, version = version + 1", [int(starred)])
+        if updated:
+            self._notify("star", card_id, self.get(card_id))
+        return updated
+
+    def delete(self, card_id, expected_version=None):
+        deleted = self._update(card_id, expected_version, "DELETE FROM cards", [])
+        if deleted:
+            self._notify("delete", card_id, None)
+        return deleted
+
+
+def migrate(json_file=DATA_FILE, db_file=DB_FILE):
+    """把JSON快照+操作日志中的全部卡片导入SQLite库（按id覆盖，可重复执行）"""
+    cards = CardStore(json_file).all_cards()
+    SQLiteCardStore(db_file).add_many(cards)
+    return len(cards)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # 用法: python sqlite_store.py migrate [JSON文件] [SQLite文件]
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        json_file = sys.argv[2] if len(sys.argv) >= 3 else DATA_FILE
+        db_file = sys.argv[3] if len(sys.argv) >= 4 else DB_FILE
+        print(f"已迁移 {migrate(json_file, db_file)} 张卡片到 {db_file}")
+    else:
+        print("用法: python sqlite_store.py migrate [json_file] [db_file]")
@@ -0,0 +1,505 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有fcntl，改用msvcrt加锁
+    fcntl = None
+    import msvcrt
+
+from metrics import metrics
+
+# 卡片存储层：快照（questions&answers.json，沿用原有的JSON数组格式） + 追加写操作日志
+# 每次收藏/取消收藏/删除/新增只向日志追加一行，I/O与卡片总数无关；
+# 日志累积到一定数量后再压缩进快照（临时文件 + os.replace 原子替换）
+# 多进程/多会话写入通过咨询式文件锁串行化，每张卡片带版本号，过期的修改会被拒绝而不是覆盖
+
+DATA_FILE = "questions&answers.json"
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = ["技术原理与基础概念", "产品设计与用户体验",
+              "产品落地与工程实践", "特定场景与行业应用",
+              "团队协作与职业发展"]
+STARRED_VIEW = "重点标注学习"
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def now_timestamp():
+    return datetime.now().strftime(TIMESTAMP_FORMAT)
+
+
+def normalize_card(item):
+    """把旧数据（例如QASaver写入的带status、缺timestamp的条目）规整为统一的卡片结构"""
+    return {
+        "id": str(item.get("id") or uuid.uuid4()),
+        "category": item.get("category", "AI解答"),
+        "question": item.get("question", ""),
+        "answer": item.get("answer", ""),
+        "timestamp": item.get("timestamp") or now_timestamp(),
+        "starred": bool(item.get("starred", False)),
+        "version": int(item.get("version", 1)),
+    }
+
+
+class ConflictError(Exception):
+    """卡片在读取之后已被其他写入方修改（版本号不一致）"""
+
+
+class FileLock:
+    def __init__(self, path):
+        """基于锁文件的咨询式排他锁，同一对象可重入"""
+        self.path = path
+        self._fd = None
+        self._depth = 0
+        self._thread_lock = threading.RLock()
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            except Exception:
+                os.close(fd)
+                self._thread_lock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+
+class CardStore:
+    def __init__(self, data_file=DATA_FILE, compact_every=500):
+        """打开存储：读取快照并重放操作日志，重建内存中的卡片状态"""
+        self.data_file = data_file
+        self.journal_file = data_file + ".journal"
+        self.compact_every = compact_every
+        self.cards = {}  # id -> 卡片，保持插入顺序
+        self._journal_ops = 0
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(data_file + ".lock")
+        # 写入代数：每次变更+1，分类视图按代数失效
+        self.generation = 0
+        self._views = {}
+        self._signature = None
+        self.stats = {"parses": 0, "parses_avoided": 0}
+        self._listeners = []
+        self.load()
+
+    # ---------- 读取 ----------
+
+    def load(self):
+        # 加锁读取，避免读到旧快照后日志又被其他进程的压缩截断
+        with self._lock, self._file_lock:
+            previous = self.cards
+            self.cards = {}
+            for card in self._snapshot_cards():
+                self.cards[card["id"]] = card
+            self._journal_ops = self._replay_journal()
+            self._signature = self._file_signature()
+            self.stats["parses"] += 1
+            self._bump()
+            self._notify_changes(previous)
+
+    def _notify_changes(self, previous):
+        """重新加载后只通知内容有变化的卡片，监听方（检索索引等）增量更新而不必整体重建"""
+        if not self._listeners:
+            return
+        for card_id, card in self.cards.items():
+            old = previous.get(card_id)
+            if old == card:
+                continue
+            if old is not None and dict(old, starred=card["starred"], version=card["version"]) == card:
+                self._notify("star", card_id, card)
+            else:
+                self._notify("add", card_id, card)
+        for card_id in previous.keys() - self.cards.keys():
+            self._notify("delete", card_id, None)
+
+    def subscribe(self, callback):
+        """注册变更回调 callback(op, card_id, card)，op 为 add/delete/star/reset，供索引增量更新。
+        star 表示收藏状态变化（收藏与取消收藏），card 为更新后的卡片；
+        回调在持有store锁时调用，耗时的处理应推迟到锁外"""
+        self._listeners.append(callback)
+
+    def _notify(self, op, card_id, card):
+        for callback in self._listeners:
+            callback(op, card_id, card)
+
+    def _file_signature(self):
+        """快照与日志文件的 (inode, mtime, size)，用于发现其他写入方的修改"""
+        signature = []
+        for path in (self.data_file, self.journal_file):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_ino, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def refresh(self):
+        """文件未被其他写入方改动时直接复用内存状态，否则重新加载。返回是否重新加载"""
+        with self._lock:
+            if self._file_signature() == self._signature:
+                self.stats["parses_avoided"] += 1
+                return False
+            self.load()
+            return True
+
+    def _bump(self):
+        self.generation += 1
+        self._views = {}
+
+    def _snapshot_cards(self):
+        """快照中的卡片（已规整），子类可替换快照格式"""
+        return [normalize_card(item) for item in self._read_snapshot()]
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.data_file):
+            return []
+        try:
+            with metrics.timer("storage_io_seconds", op="read_snapshot"):
+                with open(self.data_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                    metrics.inc("storage_bytes_read_total", f.buffer.tell(), op="read_snapshot")
+        except json.JSONDecodeError as e:
+            logger.warning("快照文件损坏，按空数据处理: %s", e)
+            return []
+        if not isinstance(data, list):
+            return []
+        return [item for item in data if isinstance(item, dict)]
+
+    def _replay_journal(self):
+        if not os.path.exists(self.journal_file):
+            return 0
+        count = 0
+        valid_end = 0
+        started = time.perf_counter()
+        with open(self.journal_file, "rb") as f:
+            for raw in f:
+                try:
+                    if not raw.endswith(b"\n"):
+                        raise ValueError("记录未以换行结尾")
+                    line = raw.decode("utf-8").strip()
+                    record = json.loads(line) if line else None
+                except ValueError:
+                    # 崩溃时最后一行可能只写了一半，截断后丢弃
+                    logger.warning("操作日志末尾存在不完整的记录，已截断")
+                    break
+                valid_end += len(raw)
+                if record:
+                    self._apply(record, notify=False)
+                    count += 1
+        metrics.observe("storage_io_seconds", time.perf_counter() - started, op="replay_journal")
+        metrics.inc("storage_bytes_read_total", valid_end, op="replay_journal")
+        if valid_end < os.path.getsize(self.journal_file):
+            with open(self.journal_file, "r+b") as f:
+                f.truncate(valid_end)
+        return count
+
+    def _apply(self, record, notify=True):
+        """应用一条日志记录。所有操作都是幂等的（版本号写的是绝对值），压缩中途崩溃后重放不会出错"""
+        op = record.get("op")
+        if op == "add":
+            card = normalize_card(record["card"])
+            self.cards[card["id"]] = card
+            if notify:
+                self._notify("add", card["id"], card)
+        elif op in ("star", "unstar"):
+            card = self.cards.get(record.get("id"))
+            if card is not None:
+                card["starred"] = op == "star"
+                card["version"] = record.get("version", card["version"] + 1)
+                if notify:
+                    self._notify("star", card["id"], card)
+        elif op == "delete":
+            if self.cards.pop(record.get("id"), None) is not None and notify:
+                self._notify("delete", record.get("id"), None)
+
+    def get(self, card_id):
+        return self.cards.get(card_id)
+
+    def answer(self, card_id):
+        """卡片的回答正文，卡片不存在时返回None。
+        列表/视图中的卡片不保证带 answer 字段（PackedCardStore 只常驻元数据），读取正文统一走这里"""
+        card = self.cards.get(card_id)
+        return card["answer"] if card is not None else None
+
+    def all_cards(self):
+        with self._lock:
+            return list(self.cards.values())
+
+    def view(self, category):
+        """按时间倒序的分类视图（重点标注学习为各分类中已收藏的卡片）。
+        视图在同一写入代数内共享，不复制卡片，调用方不得修改返回的列表和卡片"""
+        with self._lock:
+            items = self._views.get(category)
+            if items is None:
+                if category == STARRED_VIEW:
+                    items = [card for card in self.cards.values()
+                             if card["starred"] and card["category"] in CATEGORIES]
+                else:
+                    items = [card for card in self.cards.values() if card["category"] == category]
+                items.sort(key=lambda card: card["timestamp"], reverse=True)
+                self._views[category] = items
+            return items
+
+    def count(self, category):
+        return len(self.view(category))
+
+    def page(self, category, offset=0, limit=20):
+        """分类视图中的一页，接口与 SQLiteCardStore.page 一致"""
+        return self.view(category)[offset:offset + limit]
+
+    # ---------- 写入 ----------
+
+    def _append(self, record):
+        self._append_many([record])
+
+    def _append_many(self, records):
+        """一次写入多条记录，只做一次fsync。调用方需持有文件锁并已 refresh()"""
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+        with metrics.timer("storage_io_seconds", op="append"):
+            with open(self.journal_file, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        metrics.inc("storage_bytes_written_total", len(data), op="append")
+        for record in records:
+            self._apply(record)
+        self._bump()
+        self._signature = self._file_signature()
+        self._journal_ops += len(records)
+        if self.compact_every and self._journal_ops >= self.compact_every:
+            self.compact()
+
+    def _check_version(self, card_id, expected_version):
+        """返回当前卡片；卡片不存在时返回None，版本不一致时抛出ConflictError"""
+        card = self.cards.get(card_id)
+        if card is not None and expected_version is not None and card["version"] != expected_version:
+            raise ConflictError(f"卡片 {card_id} 已被修改（当前版本 {card['version']}，预期 {expected_version}）")
+        return card
+
+    def add(self, question, answer, category, card_id=None, timestamp=None, starred=False):
+        return self.add_many([{
+            "id": card_id or str(uuid.uuid4()),
+            "category": category,
+            "question": question,
+            "answer": answer,
+            "timestamp": timestamp or now_timestamp(),
+            "starred": starred,
+        }])[0]
+
+    def add_many(self, items, overwrite=True):
+        """批量新增卡片（字段同 add），整批只追加一次日志。id已存在时覆盖并递增版本号；
+        overwrite 为False时跳过已存在的id（在文件锁内检查，不会覆盖其他进程刚写入的卡片）。
+        返回实际写入的卡片"""
+        cards = [normalize_card(item) for item in items]
+        if cards:
+            with self._lock, self._file_lock:
+                self.refresh()
+                if not overwrite:
+                    cards = [card for card in cards if card["id"] not in self.cards]
+                for card in cards:
+                    existing = self.cards.get(card["id"])
+                    if existing is not None:
+                        card["version"] = existing["version"] + 1
+                if cards:
+                    self._append_many([{"op": "add", "card": card} for card in cards])
+        return cards
+
+    def set_starred(self, card_id, starred=True, expected_version=None):
+        """expected_version 为调用方读到的版本号，与当前版本不一致时抛出ConflictError"""
+        with self._lock, self._file_lock:
+            self.refresh()
+            card = self._check_version(card_id, expected_version)
+            if card is None:
+                return False
+            self._append({"op": "star" if starred else "unstar", "id": card_id,
+                          "version": card["version"] + 1})
+            return True
+
+    def delete(self, card_id, expected_version=None):
+        with self._lock, self._file_lock:
+            self.refresh()
+            if self._check_version(card_id, expected_version) is None:
+                return False
+            self._append({"op": "delete", "id": card_id})
+            return True
+
+    def dedupe(self, dry_run=False):
+        """合并（问题, 回答, 分类）完全相同的重复卡片：保留最早的一张，任一副本已收藏则保留收藏。
+        返回被删除的卡片id列表；dry_run 为 True 时只统计不写入"""
+        with self._lock, self._file_lock:
+            self.refresh()
+            kept = {}
+            promote = {}  # 需要补上收藏标记的保留卡片
+            records = []
+            removed = []
+            for card in sorted(self.cards.values(), key=lambda c: c["timestamp"]):
+                key = (card["question"].strip(), self.answer(card["id"]).strip(), card["category"])
+                first = kept.setdefault(key, card)
+                if first is card:
+                    continue
+                removed.append(card["id"])
+                records.append({"op": "delete", "id": card["id"]})
+                if card["starred"] and not first["starred"]:
+                    promote[first["id"]] = first
+            for first in promote.values():
+                records.append({"op": "star", "id": first["id"], "version": first["version"] + 1})
+            if records and not dry_run:
+                self._append_many(records)
+                self.compact()
+            return removed
+
+    def compact(self):
+        """把当前状态写成新快照并清空日志。先原子替换快照再截断日志，
+        即使在两步之间崩溃，重放幂等日志也能得到相同的状态"""
+        with self._lock, self._file_lock:
+            tmp_file = self.data_file + ".tmp"
+            directory = os.path.dirname(self.data_file) or "."
+            os.makedirs(directory, exist_ok=True)
+            started = time.perf_counter()
+            metrics.inc("storage_bytes_written_total", self._write_snapshot(tmp_file), op="compact")
+            self._replace_snapshot(tmp_file)
+            metrics.observe("storage_io_seconds", time.perf_counter() - started, op="compact")
+            if os.path.exists(self.journal_file):
+                with open(self.journal_file, "w", encoding="utf-8"):
+                    pass
+            self._journal_ops = 0
+            self._signature = self._file_signature()
+
+    def _write_snapshot(self, path):
+        """把当前全部卡片写入 path 并fsync，返回写入的字节数"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(list(self.cards.values()), f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+            return f.buffer.tell()
+
+    def _replace_snapshot(self, tmp_file):
+        os.replace(tmp_file, self.data_file)
+
+    def import_json_array(self, path):
+        """一次性导入旧版JSON数组文件（跳过已存在的id），导入后立即压缩成快照"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, list):
+            raise ValueError(f"{path} 不是JSON数组")
+        imported = 0
+        with self._lock, self._file_lock:
+            self.refresh()
+            for item in data:
+                if not isinstance(item, dict) or str(item.get("id")) in self.cards:
+                    continue
+                card = normalize_card(item)
+                self.cards[card["id"]] = card
+                self._notify("add", card["id"], card)
+                imported += 1
+            self._bump()
+            self.compact()
+        return imported
+
+
+def open_store(backend=None):
+    """按配置打开卡片存储：环境变量 CARD_STORE_BACKEND=sqlite 时使用SQLite后端，
+    =packed 时使用压缩打包格式，默认JSON快照+日志"""
+    backend = backend or os.environ.get("CARD_STORE_BACKEND", "json")
+    if backend == "sqlite":
+        from sqlite_store import SQLiteCardStore, DB_FILE
+        return SQLiteCardStore(os.environ.get("CARD_DB_FILE", DB_FILE))
+    if backend == "packed":
+        from packed_store import PackedCardStore, PACK_FILE
+        return PackedCardStore(os.environ.get("CARD_PACK_FILE", PACK_FILE))
+    return CardStore(os.environ.get("CARD_DATA_FILE", DATA_FILE))
+
+
+def _stress_worker(args):
+    """压测子进程：新增并收藏自己的卡片，同时与其他进程争抢修改同一张共享卡片"""
+    data_file, worker, rounds = args
+    store = CardStore(data_file, compact_every=50)
+    succeeded = conflicts = 0
+    for i in range(rounds):
+        card = store.add(f"stress-{worker}-{i}", "stress", CATEGORIES[0])
+        store.set_starred(card["id"], True)
+        store.refresh()
+        shared = store.get("stress-shared")
+        try:
+            store.set_starred("stress-shared", not shared["starred"], expected_version=shared["version"])
+            succeeded += 1
+        except ConflictError:
+            conflicts += 1
+    return succeeded, conflicts
+
+
+def stress(data_file, workers=8, rounds=200):
+    """多进程写入压测：验证没有丢失的更新，共享卡片的版本号等于成功修改次数 + 1，否则抛出 RuntimeError"""
+    from multiprocessing import Pool
+
+    store = CardStore(data_file)
+    base = len(store.cards)
+    store.add("stress-shared", "stress", CATEGORIES[0], card_id="stress-shared")
+    with Pool(workers) as pool:
+        results = pool.map(_stress_worker, [(data_file, w, rounds) for w in range(workers)])
+    succeeded = sum(r[0] for r in results)
+    conflicts = sum(r[1] for r in results)
+    store = CardStore(data_file)
+    own = [c for c in store.cards.values() if c["question"].startswith("stress-") and c["id"] != "stress-shared"]
+    # 显式检查而不用assert：python -O 运行时压测同样要能发现丢失的更新
+    if len(store.cards) != base + 1 + workers * rounds:
+        raise RuntimeError(f"丢失了新增的卡片：应有 {base + 1 + workers * rounds} 张，实际 {len(store.cards)} 张")
+    lost = [c["id"] for c in own if not (c["starred"] and c["version"] == 2)]
+    if lost:
+        raise RuntimeError(f"丢失了收藏操作：{len(lost)} 张卡片，如 {lost[:5]}")
+    shared_version = store.get("stress-shared")["version"]
+    if shared_version != 1 + succeeded:
+        raise RuntimeError(f"共享卡片的修改被覆盖：版本号 {shared_version}，成功修改 {succeeded} 次")
+    print(f"{workers} 个进程 x {rounds} 轮：新增 {len(own)} 张，共享卡片成功修改 {succeeded} 次，"
+          f"检测到冲突 {conflicts} 次，无丢失更新")
+
+
+if __name__ == "__main__":
+    import sys
+
+    # 用法: python storage.py compact
+    #       python storage.py import <旧版JSON文件>
+    #       python storage.py dedupe [--dry-run]   合并完全重复的卡片
+    #       python storage.py stress <临时数据文件>   多进程写入压测（会写入该文件，勿指向正式数据）
+    if len(sys.argv) >= 3 and sys.argv[1] == "stress":
+        stress(sys.argv[2])
+        sys.exit(0)
+    store = CardStore()
+    if len(sys.argv) >= 2 and sys.argv[1] == "compact":
+        store.compact()
+        print(f"已压缩，共 {len(store.cards)} 张卡片")
+    elif len(sys.argv) >= 2 and sys.argv[1] == "dedupe":
+        dry_run = "--dry-run" in sys.argv
+        removed = store.dedupe(dry_run=dry_run)
+        print(f"{'发现' if dry_run else '已合并'} {len(removed)} 张重复卡片，剩余 {len(store.cards) - (len(removed) if dry_run else 0)} 张")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "import":
+        count = store.import_json_array(sys.argv[2])
+        print(f"已导入 {count} 张卡片，共 {len(store.cards)} 张")
+    else:
+        print("用法: python storage.py compact | dedupe [--dry-run] | import <file> | stress <file>")
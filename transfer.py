@@ -0,0 +1,336 @@
+import csv
+import hashlib
+import itertools
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+from storage import CATEGORIES, STARRED_VIEW, normalize_card, open_store
+
+# 卡片的批量导入/导出与增量同步。读写都是逐张处理的生成器流水线：
+# 导入按批写入store，内存中只保留已有卡片的内容哈希和当前这一批；导出逐张写出，回答正文按需读取
+# 支持的格式：JSONL（每行一张卡片）、CSV（表头 question,answer,category[,id,timestamp,starred]）、
+# Markdown（"# 分类" 下每个 "## 问题" 标题之后的内容为回答）
+
+FORMATS = ("jsonl", "csv", "md")
+CSV_FIELDS = ["id", "category", "question", "answer", "timestamp", "starred"]
+IMPORT_BATCH = 1000
+
+_TRUE_VALUES = {"1", "true", "yes", "y", "是"}
+
+
+def content_hash(category, question, answer):
+    """按（分类, 问题, 回答）去掉首尾空白后计算的内容哈希，与 CardStore.dedupe 的判重标准一致"""
+    payload = json.dumps([category, question.strip(), answer.strip()], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def detect_format(path):
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    fmt = {"markdown": "md"}.get(ext, ext)
+    if fmt not in FORMATS:
+        raise ValueError(f"无法识别的文件格式: {path}（支持 .jsonl / .csv / .md）")
+    return fmt
+
+
+# ---------- 读取 ----------
+
+def read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def read_csv(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            if "starred" in row:
+                row["starred"] = str(row["starred"]).strip().lower() in _TRUE_VALUES
+            yield row
+
+
+def read_markdown(path):
+    """一级标题为分类，二级标题为问题，其后直到下一个一/二级标题的内容为回答（代码块内的#行不算标题）"""
+    category = None
+    card = None
+    in_code = False
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("```"):
+                in_code = not in_code
+            if not in_code and (line.startswith("# ") or line.startswith("## ")):
+                if card is not None:
+                    card["answer"] = "".join(card["answer"]).strip()
+                    yield card
+                    card = None
+                if line.startswith("# "):
+                    category = line[2:].strip()
+                else:
+                    card = {"category": category, "question": line[3:].strip(), "answer": []}
+            elif card is not None:
+                card["answer"].append(line)
+    if card is not None:
+        card["answer"] = "".join(card["answer"]).strip()
+        yield card
+
+
+READERS = {"jsonl": read_jsonl, "csv": read_csv, "md": read_markdown}
+
+
+def read_cards(path, fmt=None):
+    return READERS[fmt or detect_format(path)](path)
+
+
+# ---------- 导入 ----------
+
+def _batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+@contextmanager
+def _bulk_write(store):
+    """JSON快照类后端：批量写入期间暂停按日志条数自动压缩，结束后只压缩一次"""
+    compact_every = getattr(store, "compact_every", None)
+    if not compact_every:
+        yield
+        return
+    store.compact_every = 0
+    try:
+        yield
+    finally:
+        store.compact_every = compact_every
+        store.compact()
+
+
+def import_cards(store, items, default_category=CATEGORIES[0], batch_size=IMPORT_BATCH, dry_run=False):
+    """把 items（卡片字典的可迭代对象）按批导入store，跳过内容哈希已存在的卡片（含同一文件内的重复）。
+    缺少问题或回答的条目计为无效。返回统计信息"""
+    seen = {content_hash(card["category"], card["question"], store.answer(card["id"]) or "")
+            for card in store.all_cards()}
+    stats = {"read": 0, "imported": 0, "duplicates": 0, "invalid": 0}
+    started = time.time()
+    with nullcontext() if dry_run else _bulk_write(store):
+        for batch in _batches(items, batch_size):
+            cards = []
+            for item in batch:
+                stats["read"] += 1
+                if not isinstance(item, dict) or not item.get("question") or not item.get("answer"):
+                    stats["invalid"] += 1
+                    continue
+                item = dict(item, category=item.get("category") or default_category)
+                digest = content_hash(item["category"], item["question"], item["answer"])
+                if digest in seen:
+                    stats["duplicates"] += 1
+                    continue
+                seen.add(digest)
+                cards.append(normalize_card(item))
+            if cards and not dry_run:
+                store.add_many(cards)
+            stats["imported"] += len(cards)
+    stats["elapsed"] = round(time.time() - started, 3)
+    return stats
+
+
+# ---------- 导出 ----------
+
+def select_cards(store, category=None, starred=None, query=None):
+    """按分类、收藏状态、检索词筛选卡片（生成器，不含回答正文）。
+    有检索词时按相关度排序，否则按store中的顺序"""
+    if query:
+        if hasattr(store, "search"):
+            index = store
+        else:
+            from search import SearchIndex
+            index = SearchIndex(store)
+        cards = (card for card, _ in index.search(query, category=category))
+    elif category:
+        cards = iter(store.view(category))
+    else:
+        cards = iter(store.all_cards())
+    for card in cards:
+        if starred is not None and card["starred"] != starred:
+            continue
+        if category and category != STARRED_VIEW and card["category"] != category:
+            continue
+        yield card
+
+
+def with_answers(store, cards):
+    for card in cards:
+        yield dict(card, answer=store.answer(card["id"]) or "")
+
+
+def write_jsonl(path, cards):
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for card in cards:
+            f.write(json.dumps(card, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def write_csv(path, cards):
+    count = 0
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for card in cards:
+            writer.writerow(card)
+            count += 1
+    return count
+
+
+def _escape_headings(answer):
+    """回答中（代码块以外）的一/二级标题会被当成新的分类或问题，降两级"""
+    lines = []
+    in_code = False
+    for line in answer.splitlines():
+        if line.startswith("```"):
+            in_code = not in_code
+        if not in_code and (line.startswith("# ") or line.startswith("## ")):
+            line = "##" + line
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def write_markdown(path, cards):
+    """cards 需已按分类排好序，分类变化时写出一级标题"""
+    count = 0
+    category = None
+    with open(path, "w", encoding="utf-8") as f:
+        for card in cards:
+            if card["category"] != category:
+                category = card["category"]
+                f.write(f"# {category}\n\n")
+            f.write(f"## {card['question']}\n\n{_escape_headings(card['answer'])}\n\n")
+            count += 1
+    return count
+
+
+WRITERS = {"jsonl": write_jsonl, "csv": write_csv, "md": write_markdown}
+
+
+def export_cards(store, path, fmt=None, category=None, starred=None, query=None):
+    """按条件导出卡片，返回导出张数"""
+    cards = select_cards(store, category, starred, query)
+    fmt = fmt or detect_format(path)
+    if fmt == "md":
+        # Markdown按分类分组：先只对元数据排序（保持分类内原有顺序），写出时再逐张读取回答
+        cards = sorted(cards, key=lambda card: card["category"])
+    return WRITERS[fmt](path, with_answers(store, cards))
+
+
+# ---------- 增量同步 ----------
+# 单向同步（发送方为准）：版本标记记录上次同步时发送方每张卡片的版本号 {id: version}。
+# 发送方只导出标记之后新增或版本变化的卡片，以及标记中有、现在已删除的卡片（墓碑记录），
+# 并生成新的标记供下次使用；接收方按记录覆盖或删除
+
+def load_marker(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["cards"]
+
+
+def save_marker(path, versions):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "cards": versions}, f)
+    os.replace(tmp_path, path)
+
+
+def changes_since(store, marker):
+    """生成 {"op": "add", "card": ...} / {"op": "delete", "id": ...} 变更记录"""
+    current = set()
+    for card in store.all_cards():
+        current.add(card["id"])
+        if marker.get(card["id"]) != card["version"]:
+            yield {"op": "add", "card": dict(card, answer=store.answer(card["id"]) or "")}
+    for card_id in marker:
+        if card_id not in current:
+            yield {"op": "delete", "id": card_id}
+
+
+def export_changes(store, path, marker_file=None, new_marker_file=None):
+    """把版本标记之后的变更写成JSONL，返回 (新增/修改数, 删除数)。
+    new_marker_file 默认覆盖 marker_file，确认对方已应用后再使用新标记即可"""
+    marker = load_marker(marker_file)
+    versions = {card["id"]: card["version"] for card in store.all_cards()}
+    added = deleted = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for record in changes_since(store, marker):
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if record["op"] == "add":
+                added += 1
+            else:
+                deleted += 1
+    if new_marker_file or marker_file:
+        save_marker(new_marker_file or marker_file, versions)
+    return added, deleted
+
+
+def apply_changes(store, path, batch_size=IMPORT_BATCH):
+    """应用 export_changes 生成的变更文件：新增/修改按id覆盖，删除按id删除。返回 (覆盖数, 删除数)"""
+    added = deleted = 0
+    with _bulk_write(store):
+        for batch in _batches(read_jsonl(path), batch_size):
+            cards = [record["card"] for record in batch if record.get("op") == "add"]
+            if cards:
+                store.add_many(cards)
+                added += len(cards)
+            for record in batch:
+                if record.get("op") == "delete" and store.delete(record["id"]):
+                    deleted += 1
+    return added, deleted
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # 用法: python transfer.py import cards.csv --category 技术原理与基础概念
+    #       python transfer.py export starred.md --starred --query 评估
+    #       python transfer.py sync-export changes.jsonl --marker last_sync.json    （发送方）
+    #       python transfer.py sync-apply changes.jsonl                             （接收方）
+    # 卡片库由 CARD_STORE_BACKEND 等环境变量选择，与 app.py 相同
+    parser = argparse.ArgumentParser(description="卡片批量导入/导出与增量同步")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("import", help="从 JSONL/CSV/Markdown 导入，按内容哈希去重")
+    p.add_argument("file")
+    p.add_argument("--format", choices=FORMATS)
+    p.add_argument("--category", default=CATEGORIES[0], help="条目未指定分类时使用的分类")
+    p.add_argument("--dry-run", action="store_true")
+    p = sub.add_parser("export", help="按条件导出为 JSONL/CSV/Markdown")
+    p.add_argument("file")
+    p.add_argument("--format", choices=FORMATS)
+    p.add_argument("--category")
+    p.add_argument("--starred", action="store_true", help="只导出已收藏的卡片")
+    p.add_argument("--query", help="只导出检索命中的卡片")
+    p = sub.add_parser("sync-export", help="导出版本标记之后的变更")
+    p.add_argument("file")
+    p.add_argument("--marker", help="上次同步的版本标记文件，不存在时导出全部")
+    p.add_argument("--new-marker", help="新标记的写入位置，默认覆盖 --marker")
+    p = sub.add_parser("sync-apply", help="应用对方导出的变更")
+    p.add_argument("file")
+    args = parser.parse_args()
+
+    store = open_store()
+    if args.command == "import":
+        print(import_cards(store, read_cards(args.file, args.format), args.category, dry_run=args.dry_run))
+    elif args.command == "export":
+        count = export_cards(store, args.file, args.format, args.category,
+                             True if args.starred else None, args.query)
+        print(f"已导出 {count} 张卡片到 {args.file}")
+    elif args.command == "sync-export":
+        added, deleted = export_changes(store, args.file, args.marker, args.new_marker)
+        print(f"已导出 {added} 张新增/修改、{deleted} 张删除到 {args.file}")
+    elif args.command == "sync-apply":
+        added, deleted = apply_changes(store, args.file)
+        print(f"已覆盖 {added} 张、删除 {deleted} 张卡片")